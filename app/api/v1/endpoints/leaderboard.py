@@ -1,21 +1,61 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from uuid import UUID
 
-from app.core.database import get_db
+from app.core.database import get_read_db
 from app.services.leaderboard_service import LeaderboardService
+from app.services.leaderboard_cache import leaderboard_cache
+from app.services.leaderboard_stream import leaderboard_stream
 
 router = APIRouter()
 
-@router.get("/score")
-async def get_score_leaderboard(limit: int = 10, db: AsyncSession = Depends(get_db)):
+async def leaderboard_page(board: str, limit: int, offset: int, window: str, db: AsyncSession) -> Response:
     service = LeaderboardService(db)
-    leaders = await service.get_score_leaderboard(limit)
-    return leaders
+    body, next_offset = await service.get_leaderboard_page(board, limit, offset, window)
+    headers = {"X-Next-Offset": str(next_offset)} if next_offset is not None else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/score")
+async def get_score_leaderboard(
+    limit: int = 10,
+    offset: int = Query(0, ge=0),
+    window: str = "all",
+    db: AsyncSession = Depends(get_read_db)
+):
+    return await leaderboard_page("score", limit, offset, window, db)
 
 @router.get("/streak")
-async def get_streak_leaderboard(limit: int = 10, db: AsyncSession = Depends(get_db)):
+async def get_streak_leaderboard(
+    limit: int = 10,
+    offset: int = Query(0, ge=0),
+    window: str = "all",
+    db: AsyncSession = Depends(get_read_db)
+):
+    return await leaderboard_page("streak", limit, offset, window, db)
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return leaderboard_cache.stats()
+
+@router.get("/{board}/stream")
+async def stream_leaderboard(board: str, limit: int = 10, window: str = "all"):
+    """Server-Sent Events: a ``snapshot`` of the top ``limit``, then a ``diff``
+    with the changed ranks (and the new size) whenever the board changes."""
+    return StreamingResponse(
+        leaderboard_stream.open(board, window, limit),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/{board}/around/{user_id}")
+async def get_around_user(
+    board: str,
+    user_id: str,
+    radius: int = Query(5, ge=0),
+    window: str = "all",
+    db: AsyncSession = Depends(get_read_db)
+):
     service = LeaderboardService(db)
-    leaders = await service.get_streak_leaderboard(limit)
-    return leaders
+    return await service.get_around(board, user_id, radius, window)
@@ -1,22 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 from typing import Optional
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.services.quiz_service import QuizService
-from app.schemas.quiz import QuestionResponse, AnswerRequest, AnswerResponse, MetricsResponse
+from app.services.question_stats import question_stats
+from app.core.config import settings
+from app.schemas.quiz import (
+    QuestionResponse, QuestionBatchResponse, AnswerRequest, AnswerResponse, MetricsResponse,
+    BulkAnswerRequest, BulkAnswerResponse, QuestionStatsResponse,
+)
 
 router = APIRouter()
 
 @router.get("/next", response_model=QuestionResponse)
 async def get_next_question(
     userId: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
 ):
-    service = QuizService(db)
+    service = QuizService(db, read_db)
     return await service.get_next_question(userId)
 
+@router.get("/next/batch", response_model=QuestionBatchResponse)
+async def get_next_batch(
+    userId: Optional[str] = None,
+    count: int = Query(5, ge=1, le=settings.QUIZ_BATCH_MAX_SIZE),
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    service = QuizService(db, read_db)
+    return await service.get_next_batch(userId, count)
+
 @router.post("/answer", response_model=AnswerResponse)
 async def submit_answer(
     request: AnswerRequest,
@@ -25,7 +41,24 @@ async def submit_answer(
     service = QuizService(db)
     return await service.submit_answer(request)
 
-@router.get("/metrics/{user_id}", response_model=MetricsResponse)
-async def get_user_metrics(user_id: str, db: AsyncSession = Depends(get_db)):
+@router.post("/answers", response_model=BulkAnswerResponse)
+async def submit_answers(
+    request: BulkAnswerRequest,
+    db: AsyncSession = Depends(get_db)
+):
     service = QuizService(db)
-    return await service.get_user_metrics(user_id)
+    return await service.submit_answers(request)
+
+@router.get("/metrics/{user_id}", response_model=MetricsResponse)
+async def get_user_metrics(
+    user_id: str,
+    rankMode: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    service = QuizService(db, read_db)
+    return await service.get_user_metrics(user_id, rankMode)
+
+@router.get("/stats/questions", response_model=QuestionStatsResponse)
+async def get_question_stats(read_db: AsyncSession = Depends(get_read_db)):
+    return await question_stats(read_db)
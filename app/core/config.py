@@ -1,10 +1,109 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Literal, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "BrainBolt API"
     DATABASE_URL: str = "postgresql+asyncpg://postgres:password@db:5432/brainbolt"
     REDIS_URL: str = "redis://redis:6379/0"
+
+    # Database engine profile (per worker; budget is WEB_WORKERS * (size + overflow))
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT_S: float = 5.0
+    DB_POOL_RECYCLE_S: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg prepared statements cached per connection (0 disables, e.g. behind pgbouncer)
+    DB_STATEMENT_CACHE_SIZE: int = 500
+    # Server-side statement_timeout (0 disables)
+    DB_STATEMENT_TIMEOUT_MS: int = 5000
+    # Checkouts waiting longer than this count as saturation events
+    DB_POOL_WAIT_WARN_MS: int = 100
+    # Gunicorn worker count, used to check the pools against max_connections
+    WEB_WORKERS: int = 4
+
+    # Optional read replica for read-only queries (may point at the primary for local testing)
+    DATABASE_REPLICA_URL: Optional[str] = None
+    # Users who wrote within this window read from the primary (read-your-writes)
+    READ_YOUR_WRITES_MS: int = 2000
+
+    # Per-user answered-question bitmaps (refreshed on every answer)
+    ANSWERED_BITMAP_TTL_SECONDS: int = 7 * 24 * 3600
+    # /v1/quiz/next/batch: max questions per batch and lifetime of the issued set
+    QUIZ_BATCH_MAX_SIZE: int = 20
+    ISSUED_QUESTIONS_TTL_SECONDS: int = 3600
+    # Reject answers to questions not in the user's issued set (one GETBIT);
+    # /next then adds its question to the set as well
+    QUIZ_REQUIRE_ISSUED: bool = False
+    # POST /v1/quiz/answers: max answers replayed in one request
+    QUIZ_BULK_MAX_ANSWERS: int = 100
+
+    # Answer submission: one INSERT ... ON CONFLICT + UPDATE ... RETURNING statement
+    SUBMIT_FAST_PATH: bool = False
+
+    # Write-behind batching of user_submissions rows (per worker)
+    SUBMISSION_WRITE_BEHIND: bool = False
+    SUBMISSION_QUEUE_SIZE: int = 10000
+    SUBMISSION_BATCH_SIZE: int = 500
+    SUBMISSION_FLUSH_INTERVAL_MS: int = 200
+    SUBMISSION_ENQUEUE_TIMEOUT_MS: int = 1000
+    SUBMISSION_DRAIN_TIMEOUT_S: float = 30.0
+
+    # Idempotency keys: in-flight marker lifetime, and how long a concurrent
+    # duplicate waits (polling) for the original request's stored response
+    IDEMPOTENCY_INFLIGHT_MS: int = 10000
+    IDEMPOTENCY_WAIT_MS: int = 2000
+    IDEMPOTENCY_POLL_MS: int = 20
+    # "keys": one string key per user and idempotency key; "hashes": per-user
+    # hashes bucketed by TTL-wide time windows (less memory per key)
+    IDEMPOTENCY_LAYOUT: str = "keys"
+
+    # Write-through Redis cache of UserState
+    STATE_CACHE_TTL_SECONDS: int = 24 * 3600
+
+    # Per-worker cache of leaderboard pages (0 disables)
+    LEADERBOARD_CACHE_TTL_MS: int = 250
+    # Hard cap on entries returned by one leaderboard page or window
+    LEADERBOARD_MAX_PAGE_SIZE: int = 100
+    # Retention of the per-period boards (dailies must outlive a week for rollups)
+    LEADERBOARD_DAILY_TTL_SECONDS: int = 8 * 24 * 3600
+    LEADERBOARD_WEEKLY_TTL_SECONDS: int = 5 * 7 * 24 * 3600
+    # Live leaderboard streams: boards are re-read at most once per debounce
+    # window after a change, idle streams get a keepalive comment, and a client
+    # with this many unsent frames is resynced with a snapshot instead
+    LEADERBOARD_STREAM_DEBOUNCE_MS: int = 250
+    LEADERBOARD_STREAM_KEEPALIVE_S: int = 15
+    LEADERBOARD_STREAM_QUEUE_SIZE: int = 16
+    # Spread the leaderboards over these Redis instances by crc32(user_id)
+    # (JSON list); empty keeps them on REDIS_URL, written with each answer
+    LEADERBOARD_REDIS_URLS: List[str] = []
+    # "sync" updates the boards in the answer's own Redis call (strict); "async"
+    # leaves them to the leaderboard projector reading the answer stream
+    LEADERBOARD_UPDATE_MODE: Literal["sync", "async"] = "sync"
+    # Rebuild the all-time boards from user_state if Redis comes up without them
+    LEADERBOARD_REBUILD_ON_STARTUP: bool = True
+    LEADERBOARD_REBUILD_CHUNK_SIZE: int = 5000
+
+    # Answer event stream (one entry per recorded answer, trimmed to about
+    # MAXLEN) and its consumer groups: entries per XREADGROUP batch, how long
+    # an idle read blocks, and the lease that keeps one consumer per group
+    # active (also run in the web workers unless disabled)
+    ANSWER_STREAM_MAXLEN: int = 100_000
+    ANSWER_STREAM_BATCH_SIZE: int = 500
+    ANSWER_STREAM_BLOCK_MS: int = 1000
+    ANSWER_STREAM_LEASE_MS: int = 15000
+    ANSWER_STREAM_CONSUMERS_IN_WORKERS: bool = True
+
+    # Per-question answer counters (Redis hash fed from the answer stream) are
+    # added to the question_stats table this often (0: only by hand)
+    QUESTION_STATS_FLUSH_INTERVAL_S: int = 60
+
+    # /metrics ranks: "exact" (ZREVRANK) or "percentile" (top X% from a
+    # per-worker histogram of the boards, exact rank only for the top K)
+    METRICS_RANK_MODE: str = "exact"
+    RANK_HISTOGRAM_BUCKETS: int = 64
+    RANK_HISTOGRAM_REFRESH_MS: int = 10000
+    RANK_EXACT_TOP_K: int = 1000
     
     class Config:
         env_file = ".env"
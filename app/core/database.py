@@ -1,8 +1,85 @@
+import time
+from typing import Optional
+from sqlalchemy import exc, event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import structlog
 from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram, register
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+logger = structlog.get_logger()
+
+POOL_CHECKOUT_WAIT = register(Histogram(
+    "brainbolt_db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the SQLAlchemy pool",
+    (),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+))
+
+POOL_SATURATION = register(Counter(
+    "brainbolt_db_pool_saturation_events_total",
+    "Checkouts that found the pool exhausted, waited too long, or timed out",
+    ("event",),
+))
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection.
+
+    A checkout that takes the last slot (size + overflow) counts as
+    ``exhausted``; one waiting over ``DB_POOL_WAIT_WARN_MS`` as ``slow_checkout``;
+    one hitting ``DB_POOL_TIMEOUT_S`` as ``timeout``.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_WAIT.observe((), time.perf_counter() - start)
+            POOL_SATURATION.inc(("timeout",))
+            logger.warning("DB pool checkout timed out", timeout_s=self._timeout, checked_out=self.checkedout())
+            raise
+        waited = time.perf_counter() - start
+        POOL_CHECKOUT_WAIT.observe((), waited)
+        if waited * 1000 > settings.DB_POOL_WAIT_WARN_MS:
+            POOL_SATURATION.inc(("slow_checkout",))
+        return record
+
+def engine_options(url: str) -> dict:
+    """Keyword arguments for ``create_async_engine`` from the DB_* settings."""
+    options = {"echo": settings.DB_ECHO, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if not url.startswith("postgresql+asyncpg"):
+        return options
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_S,
+        pool_recycle=settings.DB_POOL_RECYCLE_S,
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "server_settings": {
+                "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+                "application_name": "brainbolt",
+            },
+        },
+    )
+    return options
+
+engine = create_async_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+
+# Read replica for read-only queries; None routes everything to the primary
+replica_engine = (
+    create_async_engine(settings.DATABASE_REPLICA_URL, **engine_options(settings.DATABASE_REPLICA_URL))
+    if settings.DATABASE_REPLICA_URL else None
+)
+
+@event.listens_for(engine.sync_engine.pool, "checkout")
+def _count_exhaustion(dbapi_connection, connection_record, connection_proxy):
+    pool = engine.sync_engine.pool
+    if isinstance(pool, TimedQueuePool) and pool.checkedout() >= pool.size() + settings.DB_MAX_OVERFLOW:
+        POOL_SATURATION.inc(("exhausted",))
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -10,9 +87,103 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 
+ReadSessionLocal = sessionmaker(
+    bind=replica_engine or engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+def pool_usage(db_engine) -> dict:
+    return {
+        ("checked_out",): db_engine.pool.checkedout(),
+        ("idle",): db_engine.pool.checkedin(),
+        ("overflow",): max(db_engine.pool.overflow(), 0),
+        ("size",): db_engine.pool.size(),
+    }
+
+register(Gauge(
+    "brainbolt_db_pool_connections",
+    "SQLAlchemy connection pool usage in this worker",
+    ("state",),
+    lambda: pool_usage(engine),
+))
+
+if replica_engine is not None:
+    register(Gauge(
+        "brainbolt_db_replica_pool_connections",
+        "SQLAlchemy replica connection pool usage in this worker",
+        ("state",),
+        lambda: pool_usage(replica_engine),
+    ))
+
+def recent_write_key(user_id: str) -> str:
+    return f"recent_write:{user_id}"
+
+async def pick_session(
+    user_id: str,
+    db: AsyncSession,
+    read_db: Optional[AsyncSession],
+    redis_client,
+    recently_wrote: Optional[bool] = None,
+) -> AsyncSession:
+    """Session for a read-only query about ``user_id``.
+
+    The replica, unless none is configured or the user wrote to the primary
+    within ``READ_YOUR_WRITES_MS`` (the ``recent_write`` marker set by
+    writers). Pass ``recently_wrote`` when the marker was already fetched.
+    """
+    if read_db is None or replica_engine is None:
+        return db
+    if recently_wrote is None:
+        recently_wrote = bool(await redis_client.exists(recent_write_key(user_id)))
+    return db if recently_wrote else read_db
+
+async def check_connection_budget():
+    """Log this deployment's worst-case connection count against Postgres
+    ``max_connections`` (minus superuser_reserved_connections), warning
+    when all workers' pools at full overflow would not fit."""
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        async with engine.connect() as conn:
+            max_connections = int((await conn.execute(text("SHOW max_connections"))).scalar())
+            reserved = int((await conn.execute(text("SHOW superuser_reserved_connections"))).scalar())
+    except Exception as e:
+        logger.error("Could not read max_connections", error=str(e))
+        return
+    per_worker = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    budget = settings.WEB_WORKERS * per_worker
+    available = max_connections - reserved
+    log = logger.warning if budget > available else logger.info
+    log(
+        "DB connection budget",
+        workers=settings.WEB_WORKERS,
+        per_worker=per_worker,
+        budget=budget,
+        max_connections=max_connections,
+        available=available,
+    )
+
 class Base(DeclarativeBase):
     pass
 
+# Columns added to existing tables since their first release: create_all only
+# creates missing tables, so these run (idempotently) after it at startup
+SCHEMA_UPGRADES = (
+    "ALTER TABLE user_state ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0",
+)
+
+async def upgrade_schema(conn):
+    if conn.dialect.name != "postgresql":
+        return
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_read_db():
+    """Session on the read replica (the primary when none is configured)."""
+    async with ReadSessionLocal() as session:
+        yield session
@@ -0,0 +1,172 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; dense at the low end where API latencies live
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus exposition format.
+
+    Observations are a bisect plus three integer/float updates. The event
+    loop is single threaded, so no locking is needed.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (repr(bound),))} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total[0]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Gauge:
+    """Metric read from a callback at scrape time, so nothing is paid per request.
+
+    The callback returns ``{label_values: value}``; use ``()`` for no labels.
+    Pass ``kind="counter"`` for monotonic values kept elsewhere.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        read: Callable[[], Dict[Tuple[str, ...], float]],
+        kind: str = "gauge",
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.read().items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+REGISTRY: List = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+REQUEST_LATENCY = register(Histogram(
+    "brainbolt_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+))
+
+STAGE_LATENCY = register(Histogram(
+    "brainbolt_stage_duration_seconds",
+    "Time spent in each stage (db, redis, serialization) of a service operation",
+    ("operation", "stage"),
+))
+
+@contextmanager
+def timed(operation: str, stage: str):
+    """Record the time spent in ``stage`` of ``operation``; works around awaits."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe((operation, stage), time.perf_counter() - start)
+
+def include_router(app, router, prefix: str, **kwargs):
+    """``app.include_router`` that also records ``prefix`` on the router's
+    routes for route_template: the matched route only knows its own path,
+    not the prefix it was included under."""
+    app.include_router(router, prefix=prefix, **kwargs)
+    for route in router.routes:
+        route.include_prefix = prefix
+
+def route_template(scope) -> str:
+    """Template of the matched route, e.g. ``/v1/quiz/metrics/{user_id}``:
+    its include prefix plus its path. Never built from the request path, so
+    no path param value can end up in the label."""
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    return getattr(route, "include_prefix", "") + route.path
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request latency per route template.
+
+    Paths are labelled with the matched route's template (for example
+    ``/v1/quiz/metrics/{user_id}``), never the raw path, which keeps the
+    number of series bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.observe((scope["method"], route_template(scope), str(status)), time.perf_counter() - start)
@@ -1,7 +1,33 @@
 import redis.asyncio as redis
+from typing import List
 from app.core.config import settings
+from app.core.metrics import Gauge, register
 
 pool = redis.ConnectionPool.from_url(settings.REDIS_URL, decode_responses=True)
 
+register(Gauge(
+    "brainbolt_redis_pool_connections",
+    "Redis connection pool usage in this worker",
+    ("state",),
+    lambda: {
+        ("in_use",): len(pool._in_use_connections),
+        ("idle",): len(pool._available_connections),
+        ("max",): pool.max_connections,
+    },
+))
+
+# Leaderboard shards; empty when the boards live on REDIS_URL
+leaderboard_pools = [
+    redis.ConnectionPool.from_url(url, decode_responses=True) for url in settings.LEADERBOARD_REDIS_URLS
+]
+
 def get_redis_client():
     return redis.Redis(connection_pool=pool)
+
+def get_leaderboard_clients() -> List[redis.Redis]:
+    return [redis.Redis(connection_pool=shard_pool) for shard_pool in leaderboard_pools]
+
+def register_script(source: str):
+    """Register a Lua script once per process. Calls go through EVALSHA and
+    transparently reload the script if Redis has flushed its script cache."""
+    return get_redis_client().register_script(source)
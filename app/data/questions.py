@@ -1,12 +1,25 @@
-from typing import List, Optional
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_answer(answer: str) -> str:
+    """Canonical form used to compare a submitted answer with the correct one."""
+    return answer.lower().strip()
+
 
 class Question:
+    __slots__ = ("id", "prompt", "difficulty", "choices", "correct_answer", "normalized_answer", "index")
+
     def __init__(self, id: str, prompt: str, difficulty: int, choices: List[str], correct_answer: str):
         self.id = id
         self.prompt = prompt
         self.difficulty = difficulty
-        self.choices = choices
+        self.choices = tuple(choices)
         self.correct_answer = correct_answer
+        # Precomputed once so answer checks don't re-normalize per request
+        self.normalized_answer = normalize_answer(correct_answer)
+        # Dense position in the bank, assigned by QuestionRepository
+        self.index = -1
 
 # Static list of questions
 QUESTIONS_DB = [
@@ -78,17 +91,53 @@ QUESTIONS_DB = [
 ]
 
 class QuestionRepository:
+    """Read-only index over the question bank, built once at load.
+
+    Lookups by id are O(1) and the per-difficulty buckets are immutable tuples,
+    so callers get the same object on every call instead of a fresh list.
+
+    Questions are also given a dense ``index`` ordered by difficulty, so every
+    bucket occupies a contiguous index range. Per-user bitmaps of answered
+    questions are keyed by that index; ``version`` changes whenever the bank
+    does, which lets stored bitmaps be invalidated.
+    """
+
+    def __init__(self, questions: Iterable[Question]):
+        ordered = sorted(questions, key=lambda q: q.difficulty)
+        for i, q in enumerate(ordered):
+            q.index = i
+        self._all: Tuple[Question, ...] = tuple(ordered)
+        self._by_id: Dict[str, Question] = {q.id: q for q in self._all}
+
+        buckets: Dict[int, List[Question]] = {}
+        for q in self._all:
+            buckets.setdefault(q.difficulty, []).append(q)
+        self._by_difficulty: Dict[int, Tuple[Question, ...]] = {d: tuple(qs) for d, qs in buckets.items()}
+        self._ranges: Dict[int, Tuple[int, int]] = {
+            d: (qs[0].index, qs[-1].index) for d, qs in self._by_difficulty.items()
+        }
+
+        digest = hashlib.sha1("\n".join(q.id for q in self._all).encode()).hexdigest()
+        self.version: str = digest[:8]
+
+    @property
+    def size(self) -> int:
+        return len(self._all)
+
     def get_question_by_id(self, question_id: str) -> Optional[Question]:
-        for q in QUESTIONS_DB:
-            if q.id == question_id:
-                return q
-        return None
-
-    def get_questions_by_difficulty(self, difficulty: int) -> List[Question]:
-        # Simple implementation: Return all match, random selection handling in service
-        return [q for q in QUESTIONS_DB if q.difficulty == difficulty]
-    
-    def get_all_questions(self):
-        return QUESTIONS_DB
-
-question_repo = QuestionRepository()
+        return self._by_id.get(question_id)
+
+    def get_question_by_index(self, index: int) -> Question:
+        return self._all[index]
+
+    def get_questions_by_difficulty(self, difficulty: int) -> Tuple[Question, ...]:
+        return self._by_difficulty.get(difficulty, ())
+
+    def get_index_range(self, difficulty: int) -> Optional[Tuple[int, int]]:
+        """Inclusive (first, last) index range of a difficulty bucket."""
+        return self._ranges.get(difficulty)
+
+    def get_all_questions(self) -> Tuple[Question, ...]:
+        return self._all
+
+question_repo = QuestionRepository(QUESTIONS_DB)
@@ -1,6 +1,15 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.core.database import engine, Base
+from fastapi.responses import PlainTextResponse
+from app.core.config import settings
+from app.core.database import engine, Base, check_connection_budget, upgrade_schema
+from app.core.metrics import MetricsMiddleware, render_metrics, include_router
+from app.services.submission_writer import submission_writer
+from app.services.leaderboard_rebuild import rebuild_if_empty
+from app.services.leaderboard_stream import leaderboard_stream
+from app.services.leaderboard_projector import leaderboard_projector
+from app.services.question_stats import question_stats_consumer, question_stats_flusher
 import structlog
 
 logger = structlog.get_logger()
@@ -10,15 +19,44 @@ async def lifespan(app: FastAPI):
     # Create tables on startup
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await upgrade_schema(conn)
+    await check_connection_budget()
+    if settings.SUBMISSION_WRITE_BEHIND:
+        submission_writer.start()
+    if settings.LEADERBOARD_UPDATE_MODE == "async":
+        # The group must exist before answers are recorded, or they are never projected
+        await leaderboard_projector.ensure_group()
+        if settings.ANSWER_STREAM_CONSUMERS_IN_WORKERS:
+            leaderboard_projector.start()
+    await question_stats_consumer.ensure_group()
+    if settings.ANSWER_STREAM_CONSUMERS_IN_WORKERS:
+        question_stats_consumer.start()
+    question_stats_flusher.start()
+    # Runs in the background so a large rebuild doesn't hold up startup
+    rebuild_task = asyncio.create_task(rebuild_if_empty()) if settings.LEADERBOARD_REBUILD_ON_STARTUP else None
     yield
+    if rebuild_task and not rebuild_task.done():
+        rebuild_task.cancel()
+    await leaderboard_stream.stop()
+    await leaderboard_projector.stop()
+    await question_stats_consumer.stop()
+    await question_stats_flusher.stop()
+    # Drain queued submissions before the worker exits
+    await submission_writer.stop()
 
 app = FastAPI(title="BrainBolt API", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 from app.api.v1.endpoints import quiz, leaderboard
-app.include_router(quiz.router, prefix="/v1/quiz", tags=["quiz"])
-app.include_router(leaderboard.router, prefix="/v1/leaderboard", tags=["leaderboard"])
+include_router(app, quiz.router, prefix="/v1/quiz", tags=["quiz"])
+include_router(app, leaderboard.router, prefix="/v1/leaderboard", tags=["leaderboard"])
 
 @app.get("/")
 async def root():
     logger.info("Health check endpoint called")
     return {"message": "BrainBolt Quiz Service is live"}
+
+@app.get("/internal/metrics", include_in_schema=False)
+async def internal_metrics():
+    """Prometheus text exposition of this worker's metrics."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
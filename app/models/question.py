@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, DateTime, BigInteger, Index
+from app.core.database import Base
+
+class QuestionStat(Base):
+    """Rollup of one answer counter of a question (attempts, correct, or
+    picks of one choice), incremented by the question stats flusher."""
+    __tablename__ = "question_stats"
+
+    question_id = Column(String, primary_key=True)
+    # "attempts", "correct", "choice{i}" (index into the question's choices) or "choice_other"
+    counter = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    # Last flush batch that incremented this row; makes a retried flush a no-op
+    flush_id = Column(String, nullable=True)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index('idx_question_stats_flush_id', flush_id),
+    )
@@ -30,9 +30,13 @@ class UserState(Base):
     daily_correct = Column(Integer, default=0)
     last_activity_date = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)) # For daily reset check
 
+    # Bumped on every UPDATE; guards the Redis state cache against stale writers
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
     __table_args__ = (
         Index('idx_user_state_updated_at', updated_at),
     )
+    __mapper_args__ = {"version_id_col": version}
 
     user = relationship("User", back_populates="state")
 
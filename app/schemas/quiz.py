@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class QuestionResponse(BaseModel):
     userId: str
@@ -9,6 +9,14 @@ class QuestionResponse(BaseModel):
     choices: List[str]
     choices: List[str]
 
+class QuestionBatchResponse(BaseModel):
+    userId: str
+    difficulty: int
+    questions: List[QuestionResponse]
+    # Alternates one difficulty below/above, for after a wrong/right answer
+    easier: List[QuestionResponse]
+    harder: List[QuestionResponse]
+
 class AnswerRequest(BaseModel):
     userId: str
     questionId: str
@@ -23,6 +31,26 @@ class AnswerResponse(BaseModel):
     totalScore: int
     dailyStats: dict # {attempts: int, correct: int}
 
+class BulkAnswerItem(BaseModel):
+    questionId: str
+    answer: str
+    idempotencyKey: str
+
+class BulkAnswerRequest(BaseModel):
+    userId: str
+    answers: List[BulkAnswerItem] # applied in order
+
+class BulkAnswerResult(BaseModel):
+    idempotencyKey: str
+    questionId: str
+    status: int # the HTTP status a single /answer call would have returned
+    result: Optional[AnswerResponse] = None
+    error: Optional[str] = None
+
+class BulkAnswerResponse(BaseModel):
+    userId: str
+    results: List[BulkAnswerResult]
+
 class MetricsResponse(BaseModel):
     currentDifficulty: float
     streak: int
@@ -31,3 +59,26 @@ class MetricsResponse(BaseModel):
     scoreRank: Optional[int]
     streakRank: Optional[int]
     dailyAccuracy: float
+    # Percentile rank mode only: "top X%" of each all-time board
+    scoreTopPercent: Optional[float] = None
+    streakTopPercent: Optional[float] = None
+
+class QuestionStats(BaseModel):
+    questionId: str
+    difficulty: int
+    attempts: int
+    correct: int
+    accuracy: Optional[float]
+    picks: Dict[str, int] # by choice text
+    otherPicks: int # answers matching none of the choices
+
+class DifficultyStats(BaseModel):
+    difficulty: int
+    questions: int
+    attempts: int
+    correct: int
+    accuracy: Optional[float]
+
+class QuestionStatsResponse(BaseModel):
+    questions: List[QuestionStats]
+    difficulties: List[DifficultyStats]
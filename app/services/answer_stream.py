@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.core.metrics import Gauge, register
+from app.core.redis import get_redis_client, register_script
+
+logger = structlog.get_logger()
+
+# Capped Redis Stream with one entry per recorded answer, appended by the
+# answer-recording scripts (field "e", a packed AnswerEvent)
+ANSWER_STREAM_KEY = "answers:events"
+
+class AnswerEvent(NamedTuple):
+    """One recorded answer and the user's state right after it."""
+    user_id: str
+    question_id: str
+    answer: str
+    correct: bool
+    score_delta: int
+    total_score: int
+    streak: int
+    at_ms: int
+
+    def pack(self) -> str:
+        # Positional JSON array: new fields may only be appended (with defaults)
+        return json.dumps(list(self), separators=(",", ":"))
+
+    @classmethod
+    def unpack(cls, raw: str) -> "AnswerEvent":
+        return cls(*json.loads(raw))
+
+    @property
+    def at(self) -> datetime:
+        return datetime.fromtimestamp(self.at_ms / 1000, tz=timezone.utc)
+
+def event_ms(entry_id: str) -> int:
+    """Append time (ms) of a stream entry ID."""
+    return int(entry_id.split("-", 1)[0])
+
+# Keep the lease only if we still hold it
+RENEW_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+renew_lease_script = register_script(RENEW_LEASE_LUA)
+
+class StreamConsumer(ABC):
+    """A view derived from the answer stream. ``handle`` gets each batch in
+    stream order and must be idempotent: after a crash, entries that were
+    handled but not acked are delivered again."""
+
+    group: str = ""
+
+    @abstractmethod
+    async def handle(self, events: List[Tuple[str, AnswerEvent]]):
+        """Apply a batch of (stream id, event) pairs."""
+
+class ConsumerGroupWorker:
+    """Feeds a StreamConsumer from its consumer group on ANSWER_STREAM_KEY.
+
+    Every worker process runs one of these per consumer, but only the holder
+    of the group's lease (``answers:lease:{group}``) reads, so batches are
+    handled one at a time in stream order. Batches of up to ``batch_size``
+    entries come from XREADGROUP ... COUNT, and are XACKed once ``handle``
+    returns (at-least-once). A failed batch stays pending and is retried. A
+    worker taking over the lease first XAUTOCLAIMs the previous holder's
+    pending entries, which are older than anything still undelivered.
+    """
+
+    def __init__(
+        self,
+        consumer: StreamConsumer,
+        stream: str = ANSWER_STREAM_KEY,
+        batch_size: int = settings.ANSWER_STREAM_BATCH_SIZE,
+        block_ms: int = settings.ANSWER_STREAM_BLOCK_MS,
+        lease_ms: int = settings.ANSWER_STREAM_LEASE_MS,
+    ):
+        self.consumer = consumer
+        self.group = consumer.group
+        self.stream = stream
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.lease_ms = lease_ms
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_key = f"answers:lease:{self.group}"
+        self.redis = get_redis_client()
+        self._task: Optional[asyncio.Task] = None
+        self._renewed = 0.0
+        # Own pending entries to go through before reading new ones
+        self._backlog = True
+        self.active = False
+        self.processed = 0
+        self.reclaimed = 0
+        self.trimmed = 0
+        self.failures = 0
+        self.lag_seconds = 0.0
+        self.lag_events: Optional[int] = None
+        self.pending: Optional[int] = None
+        self._stats_at = 0.0
+        consumer_workers.append(self)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Stream consumer started", group=self.group, consumer=self.name)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self.active:
+            await renew_lease_script(keys=[self.lease_key], args=[self.name, 1], client=self.redis)
+            self.active = False
+        logger.info("Stream consumer stopped", group=self.group)
+
+    async def ensure_group(self):
+        """Create the group at the stream's end (and the stream) if missing.
+        Answers recorded before that are not replayed into the view."""
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="$", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def hold_lease(self) -> bool:
+        now = time.monotonic()
+        if self.active:
+            if now - self._renewed < self.lease_ms / 3000:
+                return True
+            held = await renew_lease_script(keys=[self.lease_key], args=[self.name, self.lease_ms], client=self.redis)
+        else:
+            held = await self.redis.set(self.lease_key, self.name, px=self.lease_ms, nx=True)
+        if held:
+            self._renewed = now
+        return bool(held)
+
+    async def reclaim(self) -> int:
+        """Move every pending entry of the group to this consumer."""
+        claimed, cursor = 0, "0-0"
+        while True:
+            # (redis-py drops the cursor from JUSTID replies, so entries come back whole)
+            result = await self.redis.xautoclaim(
+                self.stream, self.group, self.name, min_idle_time=0, start_id=cursor, count=self.batch_size
+            )
+            cursor, entries = result[0], result[1]
+            claimed += len(entries)
+            if cursor == "0-0":
+                return claimed
+
+    async def read(self, entry_id: str, block: Optional[int] = None) -> List[Tuple[str, dict]]:
+        response = await self.redis.xreadgroup(
+            self.group, self.name, {self.stream: entry_id}, count=self.batch_size, block=block
+        )
+        return response[0][1] if response else []
+
+    async def poll(self):
+        """Handle and ack one batch: this consumer's pending entries first,
+        then new ones (blocking up to ``block_ms``)."""
+        entries = await self.read("0") if self._backlog else []
+        if not entries:
+            self._backlog = False
+            entries = await self.read(">", block=self.block_ms)
+        if not entries:
+            self.lag_seconds = 0.0
+            return
+
+        events = [(entry_id, AnswerEvent.unpack(fields["e"])) for entry_id, fields in entries if fields]
+        if len(events) < len(entries):
+            # Trimmed by MAXLEN before they were handled
+            self.trimmed += len(entries) - len(events)
+            logger.warning("Answer events trimmed before processing", group=self.group, count=len(entries) - len(events))
+        if events:
+            await self.consumer.handle(events)
+        await self.redis.xack(self.stream, self.group, *(entry_id for entry_id, _ in entries))
+        self.processed += len(events)
+        self.lag_seconds = max(time.time() - event_ms(entries[-1][0]) / 1000, 0.0)
+
+    async def refresh_stats(self):
+        """Group lag (entries not yet delivered; Redis 7+) and pending count."""
+        for group in await self.redis.xinfo_groups(self.stream):
+            if group["name"] == self.group:
+                self.lag_events = group.get("lag")
+                self.pending = group["pending"]
+        self._stats_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.ensure_group()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Stream consumer group setup failed", group=self.group, error=str(e))
+                await asyncio.sleep(1)
+
+        while True:
+            try:
+                if not await self.hold_lease():
+                    self.active = False
+                    await asyncio.sleep(self.lease_ms / 3000)
+                    continue
+                if not self.active:
+                    self.active = True
+                    self._backlog = True
+                    claimed = await self.reclaim()
+                    self.reclaimed += claimed
+                    logger.info("Stream consumer took over", group=self.group, consumer=self.name, reclaimed=claimed)
+                await self.poll()
+                if time.monotonic() - self._stats_at > 1:
+                    await self.refresh_stats()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The batch stays pending and is retried from the backlog
+                self.failures += 1
+                self._backlog = True
+                logger.error("Stream consumer batch failed", group=self.group, error=str(e))
+                await asyncio.sleep(1)
+
+consumer_workers: List[ConsumerGroupWorker] = []
+
+register(Gauge(
+    "brainbolt_answer_stream_lag_seconds",
+    "Age of the newest answer event handled by this worker's last batch (0 when caught up)",
+    ("group",),
+    lambda: {(worker.group,): worker.lag_seconds for worker in consumer_workers if worker.active},
+))
+
+register(Gauge(
+    "brainbolt_answer_stream_lag_events",
+    "Answer events not yet delivered to the group (XINFO GROUPS lag, Redis 7+)",
+    ("group",),
+    lambda: {(worker.group,): worker.lag_events for worker in consumer_workers if worker.active and worker.lag_events is not None},
+))
+
+register(Gauge(
+    "brainbolt_answer_stream_pending",
+    "Answer events delivered to the group but not acked yet",
+    ("group",),
+    lambda: {(worker.group,): worker.pending for worker in consumer_workers if worker.active and worker.pending is not None},
+))
+
+register(Gauge(
+    "brainbolt_answer_stream_active",
+    "1 if this worker holds the group's lease and consumes its events",
+    ("group",),
+    lambda: {(worker.group,): int(worker.active) for worker in consumer_workers},
+))
+
+register(Gauge(
+    "brainbolt_answer_stream_events_total",
+    "Answer events by outcome: handled, reclaimed from another consumer, trimmed before handling; and failed batches",
+    ("group", "outcome"),
+    lambda: {
+        key: value
+        for worker in consumer_workers
+        for key, value in (
+            ((worker.group, "handled"), worker.processed),
+            ((worker.group, "reclaimed"), worker.reclaimed),
+            ((worker.group, "trimmed"), worker.trimmed),
+            ((worker.group, "failed_batches"), worker.failures),
+        )
+    },
+    kind="counter",
+))
@@ -0,0 +1,147 @@
+import random
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+import structlog
+from typing import Iterable, List, Optional, Set
+
+from app.models.user import UserSubmission
+from app.data.questions import question_repo, Question
+from app.core.config import settings
+from app.core.database import pick_session
+from app.core.redis import get_redis_client, register_script
+from app.services.submission_writer import submission_writer
+
+logger = structlog.get_logger()
+
+# Returns up to ARGV[5] unanswered indexes in [ARGV[2], ARGV[3]], scanning from
+# ARGV[4] to the end of the range and then wrapping around to its start.
+# Returns {-1} when the sentinel bit is missing and the bitmap must be rebuilt.
+PICK_UNANSWERED_LUA = """
+if redis.call('GETBIT', KEYS[1], ARGV[1]) == 0 then
+    return {-1}
+end
+local first, last = tonumber(ARGV[2]), tonumber(ARGV[3])
+local offset, count = tonumber(ARGV[4]), tonumber(ARGV[5])
+local picked = {}
+local function scan(from, to)
+    while #picked < count and from <= to do
+        local pos = redis.call('BITPOS', KEYS[1], 0, from, to, 'BIT')
+        if pos < 0 then
+            return
+        end
+        picked[#picked + 1] = pos
+        from = pos + 1
+    end
+end
+scan(offset, last)
+scan(first, offset - 1)
+return picked
+"""
+
+pick_unanswered_script = register_script(PICK_UNANSWERED_LUA)
+
+class AnsweredService:
+    """Per-user bitmap of answered questions, keyed by the question's dense index.
+
+    Bit ``question_repo.size`` is a sentinel marking the bitmap as complete; a
+    bitmap without it (expired, evicted, or from an older bank version) is
+    rebuilt from ``user_submissions`` on the next pick.
+    """
+
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None):
+        self.db = db
+        # Rebuilds may read from the replica unless the user wrote recently
+        self.read_db = read_db
+        self.redis = get_redis_client()
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        return f"answered:{question_repo.version}:{user_id}"
+
+    @staticmethod
+    def issued_key(user_id: str) -> str:
+        return f"issued:{question_repo.version}:{user_id}"
+
+    async def pick_unanswered(self, user_id: str, difficulty: int, count: int = 1, fallback: bool = True) -> List[Question]:
+        """Pick up to ``count`` unanswered questions, preferring ``difficulty``.
+
+        Falls back to the whole bank when the difficulty bucket is empty or
+        fully answered, mirroring the previous list-filtering behaviour,
+        unless ``fallback`` is False.
+        """
+        index_range = question_repo.get_index_range(difficulty)
+        picked: List[int] = []
+        if index_range:
+            picked = await self._pick(user_id, index_range[0], index_range[1], count)
+        if fallback and len(picked) < count:
+            everything = await self._pick(user_id, 0, question_repo.size - 1, count)
+            picked.extend(i for i in everything if i not in picked)
+        return [question_repo.get_question_by_index(i) for i in picked[:count]]
+
+    async def _pick(self, user_id: str, first: int, last: int, count: int) -> List[int]:
+        key = self.key(user_id)
+        args = [question_repo.size, first, last, random.randint(first, last), count]
+        picked = await pick_unanswered_script(keys=[key], args=args, client=self.redis)
+        if picked == [-1]:
+            await self.rebuild(user_id)
+            picked = await pick_unanswered_script(keys=[key], args=args, client=self.redis)
+        return picked
+
+    async def record_issued(self, user_id: str, questions: List[Question], replace: bool = True):
+        """Set ``questions`` in the user's issued-question bitmap in one round
+        trip, replacing what was issued before unless ``replace`` is False;
+        checking an answer against it is a single GETBIT."""
+        key = self.issued_key(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if replace:
+                pipe.delete(key)
+            for question in questions:
+                pipe.setbit(key, question.index, 1)
+            pipe.expire(key, settings.ISSUED_QUESTIONS_TTL_SECONDS)
+            await pipe.execute()
+
+    async def issued_among(self, user_id: str, questions: Iterable[Question]) -> Set[str]:
+        """Ids of ``questions`` in the user's issued set, in one round trip."""
+        questions = list(questions)
+        key = self.issued_key(user_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for question in questions:
+                pipe.getbit(key, question.index)
+            bits = await pipe.execute()
+        return {question.id for question, bit in zip(questions, bits) if bit}
+
+    async def answered_among(self, user_id: str, questions: Iterable[Question]) -> Set[str]:
+        """Ids of ``questions`` the bitmap marks as answered, in one round trip
+        (plus a rebuild when the bitmap is incomplete)."""
+        questions = list(questions)
+        key = self.key(user_id)
+        while True:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.getbit(key, question_repo.size)
+                for question in questions:
+                    pipe.getbit(key, question.index)
+                complete, *bits = await pipe.execute()
+            if complete:
+                return {question.id for question, bit in zip(questions, bits) if bit}
+            await self.rebuild(user_id)
+
+    async def rebuild(self, user_id: str):
+        """Recreate the bitmap from the user's recorded submissions, including
+        rows this worker has accepted but not yet written (write-behind mode)."""
+        session = await pick_session(user_id, self.db, self.read_db, self.redis)
+        result = await session.execute(select(UserSubmission.question_id).where(UserSubmission.user_id == user_id))
+        question_ids = set(result.scalars().all()) | submission_writer.pending_question_ids(user_id)
+        key = self.key(user_id)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            answered = 0
+            for question_id in question_ids:
+                question = question_repo.get_question_by_id(question_id)
+                if question:
+                    pipe.setbit(key, question.index, 1)
+                    answered += 1
+            pipe.setbit(key, question_repo.size, 1)
+            pipe.expire(key, settings.ANSWERED_BITMAP_TTL_SECONDS)
+            await pipe.execute()
+
+        logger.info("Rebuilt answered bitmap", user_id=user_id, answered=answered)
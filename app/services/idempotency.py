@@ -0,0 +1,254 @@
+import asyncio
+import base64
+import hashlib
+import time
+from typing import List, NamedTuple, Optional
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.redis import register_script
+from app.schemas.quiz import AnswerResponse
+
+IDEMPOTENCY_TTL_SECONDS = 86400
+
+LAYOUTS = ("keys", "hashes")
+
+# Value of an entry whose request is still being processed:
+# "inflight:{token}:{deadline_ms}". Anything else stored is a packed
+# AnswerResponse (see pack_response). A marker past its deadline counts as
+# unset everywhere (its request is presumed dead).
+INFLIGHT_PREFIX = "inflight:"
+
+# Lua helpers shared with the answer-recording scripts. An entry lives at a
+# Redis key plus a hash field; the field is '' in the "keys" layout, where
+# the entry is a whole string key.
+IDEMPOTENCY_LUA_HELPERS = """
+local idem_inflight_prefix = '""" + INFLIGHT_PREFIX + """'
+local function idem_get(key, field)
+    if field == '' then
+        return redis.call('GET', key)
+    end
+    return redis.call('HGET', key, field)
+end
+local function idem_set(key, field, value, expire_at)
+    if field == '' then
+        redis.call('SET', key, value)
+    else
+        redis.call('HSET', key, field, value)
+    end
+    redis.call('EXPIREAT', key, expire_at)
+end
+-- The stored value, or false if unset or an in-flight marker past its deadline
+local function idem_live(key, field, now_ms)
+    local value = idem_get(key, field)
+    if value and string.sub(value, 1, #idem_inflight_prefix) == idem_inflight_prefix
+        and tonumber(string.match(value, ':(%d+)$')) <= tonumber(now_ms) then
+        return false
+    end
+    return value
+end
+local function idem_del(key, field)
+    if field == '' then
+        return redis.call('DEL', key)
+    end
+    return redis.call('HDEL', key, field)
+end
+-- An in-flight marker: a plain key expires with the marker, a hash field
+-- with its bucket
+local function idem_mark(key, field, marker, marker_ttl_ms, expire_at)
+    if field == '' then
+        redis.call('SET', key, marker, 'PX', marker_ttl_ms)
+    else
+        redis.call('HSET', key, field, marker)
+        redis.call('EXPIREAT', key, expire_at)
+    end
+end
+"""
+
+# KEYS are the places the entry may live, the slot it is claimed in first.
+# Returns the stored value, or claims the entry with the in-flight marker
+# ARGV[2] and returns false. Markers past their deadline (ARGV[4] is now in
+# ms) count as unset and are removed. ARGV: field, marker, marker ttl ms,
+# now ms, slot expire-at.
+CLAIM_LUA = IDEMPOTENCY_LUA_HELPERS + """
+for i = 1, #KEYS do
+    local value = idem_live(KEYS[i], ARGV[1], ARGV[4])
+    if value then
+        return value
+    end
+    idem_del(KEYS[i], ARGV[1])
+end
+idem_mark(KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[5])
+return false
+"""
+
+# Deletes the entries (KEYS, fields ARGV[2..]) still holding our in-flight
+# marker ARGV[1].
+RELEASE_LUA = IDEMPOTENCY_LUA_HELPERS + """
+for i = 1, #KEYS do
+    if idem_get(KEYS[i], ARGV[1 + i]) == ARGV[1] then
+        idem_del(KEYS[i], ARGV[1 + i])
+    end
+end
+return 1
+"""
+
+claim_script = register_script(CLAIM_LUA)
+release_script = register_script(RELEASE_LUA)
+
+class IdempotencySlot(NamedTuple):
+    """Where an entry is written: Redis key, hash field ('' for a plain key)
+    and the absolute expiry of that key."""
+    key: str
+    field: str
+    expire_at: int
+
+class IdempotencyClaim(NamedTuple):
+    """Result of IdempotencyStore.claim: the stored value of an earlier
+    request, or None with the slot and marker now held by this one."""
+    stored: Optional[str]
+    slot: IdempotencySlot
+    marker: str
+
+def is_inflight(value: str) -> bool:
+    return value.startswith(INFLIGHT_PREFIX)
+
+def is_expired(value: str, now_ms: int) -> bool:
+    """True for an in-flight marker past its deadline (idem_live in Lua)."""
+    return is_inflight(value) and int(value.rsplit(":", 1)[1]) <= now_ms
+
+def field_digest(idempotency_key: str) -> str:
+    """Hash field of an idempotency key in the ``hashes`` layout: 64 bits of
+    BLAKE2b in base64 (11 chars instead of a 36-char UUID)."""
+    digest = hashlib.blake2b(idempotency_key.encode(), digest_size=8).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+def pack_response(response: AnswerResponse) -> str:
+    """Compact form of an AnswerResponse (~20 bytes instead of ~125 of JSON).
+    ``unpack_response(...).model_dump_json()`` gives back the exact bytes of
+    ``response.model_dump_json()``."""
+    return ",".join((
+        "1" if response.correct else "0",
+        repr(response.newDifficulty),
+        str(response.newStreak),
+        str(response.scoreDelta),
+        str(response.totalScore),
+        str(response.dailyStats["attempts"]),
+        str(response.dailyStats["correct"]),
+    ))
+
+def unpack_response(value: str) -> AnswerResponse:
+    correct, difficulty, streak, delta, total, attempts, daily_correct = value.split(",")
+    return AnswerResponse(
+        correct=correct == "1",
+        newDifficulty=float(difficulty),
+        newStreak=int(streak),
+        scoreDelta=int(delta),
+        totalScore=int(total),
+        dailyStats={"attempts": int(attempts), "correct": int(daily_correct)}
+    )
+
+class IdempotencyStore:
+    """Idempotency keys holding the (packed) response of their request.
+
+    Keys are scoped to the user who sent them. A request claims its key with
+    an in-flight marker before doing any work. Once the answer is committed,
+    the marker is replaced by the response (only while it is still the
+    request's own marker); a failed request deletes it so the client can
+    retry. A retry of a finished request gets the stored
+    response back; one arriving while the original is still running polls
+    briefly for its result.
+
+    Two layouts (``IDEMPOTENCY_LAYOUT``):
+
+    * ``keys``: one string key per user and idempotency key, expiring after
+      the TTL.
+    * ``hashes``: one hash per user and TTL-wide time bucket, a digest of
+      the idempotency key being the field (see field_digest). Lookups check the current and previous bucket, and
+      a bucket expires once it can no longer be the previous one, so entries
+      are kept for between one and two TTLs (never less than with ``keys``).
+      Small hashes are listpack-encoded (ziplist before Redis 7), which
+      removes the per-key overhead, but only up to ``hash-max-listpack-entries``
+      fields (128 by default; ``hash-max-ziplist-entries``, 512, on 6.2): a
+      user with more answers per bucket falls back to a regular hash table.
+
+    Both layouts reject the same duplicates: one key per user within the TTL.
+    """
+
+    def __init__(self, redis_client, layout: str = settings.IDEMPOTENCY_LAYOUT):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown idempotency layout {layout!r}")
+        self.redis = redis_client
+        self.layout = layout
+
+    @staticmethod
+    def key(user_id: str, idempotency_key: str) -> str:
+        return f"idempotency:{user_id}:key:{idempotency_key}"
+
+    @staticmethod
+    def bucket_key(user_id: str, bucket: int) -> str:
+        return f"idempotency:{user_id}:{bucket}"
+
+    def slot(self, user_id: str, idempotency_key: str, now: Optional[float] = None) -> IdempotencySlot:
+        """Slot a new entry for ``idempotency_key`` is written to."""
+        now = time.time() if now is None else now
+        if self.layout == "keys":
+            return IdempotencySlot(self.key(user_id, idempotency_key), "", int(now) + IDEMPOTENCY_TTL_SECONDS)
+        bucket = int(now) // IDEMPOTENCY_TTL_SECONDS
+        return IdempotencySlot(self.bucket_key(user_id, bucket), field_digest(idempotency_key), (bucket + 2) * IDEMPOTENCY_TTL_SECONDS)
+
+    def lookup_keys(self, user_id: str, slot: IdempotencySlot) -> List[str]:
+        if self.layout == "keys":
+            return [slot.key]
+        bucket = slot.expire_at // IDEMPOTENCY_TTL_SECONDS - 2
+        return [slot.key, self.bucket_key(user_id, bucket - 1)]
+
+    async def claim(self, user_id: str, idempotency_key: str, token: str) -> IdempotencyClaim:
+        """Claim ``idempotency_key`` for the request identified by ``token``.
+
+        Returns a claim whose ``stored`` is None once claimed, or the stored
+        value of an earlier request. Raises 409 if another request still holds
+        the key after ``IDEMPOTENCY_WAIT_MS``.
+        """
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_MS / 1000
+        while True:
+            now = time.time()
+            slot = self.slot(user_id, idempotency_key, now)
+            now_ms = int(now * 1000)
+            marker = self.marker(token, now_ms)
+            args = [slot.field, marker, settings.IDEMPOTENCY_INFLIGHT_MS, now_ms, slot.expire_at]
+            value = await claim_script(keys=self.lookup_keys(user_id, slot), args=args, client=self.redis)
+            if value is None or not is_inflight(value):
+                return IdempotencyClaim(value, slot, marker)
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="Request already in progress, retry")
+            await asyncio.sleep(settings.IDEMPOTENCY_POLL_MS / 1000)
+
+    @staticmethod
+    def marker(token: str, now_ms: int) -> str:
+        return f"{INFLIGHT_PREFIX}{token}:{now_ms + settings.IDEMPOTENCY_INFLIGHT_MS}"
+
+    async def release(self, claim: IdempotencyClaim):
+        await self.release_slots([claim.slot], claim.marker)
+
+    async def release_slots(self, slots: List[IdempotencySlot], marker: str):
+        """Delete the entries of ``slots`` that still hold ``marker``."""
+        await release_script(keys=[slot.key for slot in slots], args=[marker, *(slot.field for slot in slots)], client=self.redis)
+
+    async def get_many(self, user_id: str, idempotency_keys: List[str]) -> List[Optional[str]]:
+        """Stored values (packed responses or live in-flight markers) in one
+        round trip; expired markers count as unset."""
+        now = time.time()
+        if self.layout == "keys":
+            values = await self.redis.mget([self.key(user_id, key) for key in idempotency_keys])
+        else:
+            slot = self.slot(user_id, "", now)
+            current, previous = self.lookup_keys(user_id, slot)
+            fields = [field_digest(key) for key in idempotency_keys]
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hmget(current, fields)
+                pipe.hmget(previous, fields)
+                current_values, previous_values = await pipe.execute()
+            values = [c if c is not None else p for c, p in zip(current_values, previous_values)]
+        now_ms = int(now * 1000)
+        return [None if value is not None and is_expired(value, now_ms) else value for value in values]
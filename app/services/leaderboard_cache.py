@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from app.core.config import settings
+from app.core.metrics import Gauge, register
+
+class LeaderboardCache:
+    """Per-worker, short-TTL cache of serialized leaderboard pages.
+
+    Concurrent misses for the same key are coalesced (singleflight): the first
+    caller fetches, everyone else awaits its result, so there is at most one
+    in-flight Redis read per key per worker. Values are pre-serialized response
+    bodies (plus whatever small metadata the caller needs alongside), so a hit
+    is just a bytes write.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        if self.ttl <= 0:
+            self.misses += 1
+            return await fetch()
+
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # Mark a failure as retrieved even if nobody else was waiting on it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            body = await fetch()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+        finally:
+            del self._inflight[key]
+
+        self._store(key, body)
+        future.set_result(body)
+        return body
+
+    def _store(self, key: Hashable, body: Any):
+        now = time.monotonic()
+        if len(self._entries) >= self.max_entries:
+            self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+        self._entries[key] = (now + self.ttl, body)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self._entries),
+        }
+
+leaderboard_cache = LeaderboardCache(ttl=settings.LEADERBOARD_CACHE_TTL_MS / 1000)
+
+register(Gauge(
+    "brainbolt_leaderboard_cache_requests_total",
+    "Leaderboard page cache lookups by outcome",
+    ("outcome",),
+    lambda: {
+        ("hit",): leaderboard_cache.hits,
+        ("miss",): leaderboard_cache.misses,
+        ("coalesced",): leaderboard_cache.coalesced,
+    },
+    kind="counter",
+))
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+from typing import Dict, List, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.core.redis import get_redis_client, register_script
+from app.services.answer_stream import AnswerEvent, ConsumerGroupWorker, StreamConsumer
+from app.services.leaderboard_service import CHANGES_CHANNEL, answer_board_keys
+from app.services.leaderboard_shards import BOARDS_LUA_HELPERS, leaderboard_shards
+
+logger = structlog.get_logger()
+
+# Stream ID of the last answer event applied to the boards on this Redis
+WATERMARK_KEY = "leaderboard:projected"
+
+# Applies answer events to the boards in stream order. KEYS: the six boards
+# (answer_board_keys of the events' time), then WATERMARK_KEY. ARGV: daily and
+# weekly TTLs, then per event its stream ID, user id, total score, streak and
+# score delta. Events at or below the watermark were already applied (a
+# redelivered batch) and are skipped, so period deltas are never counted twice.
+PROJECT_LUA = BOARDS_LUA_HELPERS + """
+local function after(a, b)
+    local a_ms, a_seq = string.match(a, '(%d+)-(%d+)')
+    local b_ms, b_seq = string.match(b, '(%d+)-(%d+)')
+    a_ms, b_ms = tonumber(a_ms), tonumber(b_ms)
+    return a_ms > b_ms or (a_ms == b_ms and tonumber(a_seq) > tonumber(b_seq))
+end
+local watermark = redis.call('GET', KEYS[7]) or '0-0'
+local applied = 0
+for i = 3, #ARGV, 5 do
+    if after(ARGV[i], watermark) then
+        update_boards(ARGV[i + 1], ARGV[i + 2], ARGV[i + 3], ARGV[i + 3], ARGV[i + 4], ARGV[1], ARGV[2],
+                      KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6])
+        watermark = ARGV[i]
+        applied = applied + 1
+    end
+end
+redis.call('SET', KEYS[7], watermark)
+return applied
+"""
+
+project_script = register_script(PROJECT_LUA)
+
+Run = Tuple[List[str], List[Tuple[str, AnswerEvent]]]
+
+class LeaderboardProjector(StreamConsumer):
+    """Keeps the leaderboards up to date from the answer stream when
+    LEADERBOARD_UPDATE_MODE is "async".
+
+    Each batch becomes one script call per Redis holding boards (per shard
+    with sharded boards) and per board period, so a batch costs a few round
+    trips whatever its size; streams are notified once per batch.
+    """
+
+    group = "leaderboard"
+
+    def __init__(self):
+        self.redis = get_redis_client()
+
+    async def handle(self, events: List[Tuple[str, AnswerEvent]]):
+        clients = leaderboard_shards.clients or [self.redis]
+        # Consecutive events per Redis with the same period boards
+        runs: Dict[int, List[Run]] = {}
+        for entry_id, event in events:
+            shard = leaderboard_shards.shard_of(event.user_id) if leaderboard_shards.enabled else 0
+            keys = answer_board_keys(event.at)
+            shard_runs = runs.setdefault(shard, [])
+            if not shard_runs or shard_runs[-1][0] != keys:
+                shard_runs.append((keys, []))
+            shard_runs[-1][1].append((entry_id, event))
+
+        await asyncio.gather(*(self.apply(clients[shard], shard_runs) for shard, shard_runs in runs.items()))
+        await self.redis.publish(CHANGES_CHANNEL, "projector")
+
+    async def apply(self, client, runs: List[Run]):
+        for keys, run in runs:
+            args = [settings.LEADERBOARD_DAILY_TTL_SECONDS, settings.LEADERBOARD_WEEKLY_TTL_SECONDS]
+            for entry_id, event in run:
+                args.extend((entry_id, event.user_id, event.total_score, event.streak, event.score_delta))
+            await project_script(keys=[*keys, WATERMARK_KEY], args=args, client=client)
+
+leaderboard_projector = ConsumerGroupWorker(LeaderboardProjector())
+
+async def main():
+    argparse.ArgumentParser(
+        description="Run the leaderboard projector (LEADERBOARD_UPDATE_MODE=async) outside the web workers"
+    ).parse_args()
+    leaderboard_projector.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await leaderboard_projector.stop()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional
+from uuid import uuid4
+from sqlalchemy import select, exists
+import structlog
+
+from app.models.user import UserState
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis import get_redis_client
+from app.services.leaderboard_service import board_key, CHANGES_CHANNEL
+from app.services.leaderboard_shards import leaderboard_shards
+
+logger = structlog.get_logger()
+
+REBUILD_LOCK_KEY = "leaderboard:rebuild:lock"
+
+class LeaderboardRebuilder:
+    """Rebuild or reconcile the all-time leaderboards from ``user_state``.
+
+    Rows are streamed with keyset pagination on ``user_id`` (one short query
+    per chunk, never the whole table in memory). A rebuild writes each chunk
+    with a pipelined ZADD into staging keys and then RENAMEs them over the
+    live boards in one MULTI, so readers switch from the old board to the
+    complete new one at once. Answers recorded while the rebuild runs land
+    on the old boards and are lost by the swap; run ``diff`` afterwards.
+
+    With ``merge`` (the startup rebuild, which runs while the workers serve
+    answers) the staging keys only add the members missing from the live
+    boards (ZDIFFSTORE + ZUNIONSTORE in one MULTI) instead of replacing
+    them. A member already on a live board was written by an answer recorded
+    after the boards were lost, which is at least as new as the snapshot, so
+    nothing recorded during the rebuild is overwritten. Merging can't repair
+    drifted members; that takes a full rebuild.
+
+    Period (daily/weekly) boards have no source of truth in Postgres and are
+    left alone. With sharded boards every row goes to its user's shard and
+    each shard swaps in its own staging keys (one MULTI per shard).
+    """
+
+    def __init__(self, chunk_size: int = settings.LEADERBOARD_REBUILD_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.redis = get_redis_client()
+        self.clients = leaderboard_shards.clients or [self.redis]
+
+    def by_shard(self, rows: List) -> Dict[int, List]:
+        if not leaderboard_shards.enabled:
+            return {0: rows}
+        groups: Dict[int, List] = {}
+        for row in rows:
+            groups.setdefault(leaderboard_shards.shard_of(row.user_id), []).append(row)
+        return groups
+
+    async def stream_states(self) -> AsyncIterator[List]:
+        last_user_id: Optional[str] = None
+        while True:
+            stmt = (
+                select(UserState.user_id, UserState.total_score, UserState.current_streak)
+                .order_by(UserState.user_id)
+                .limit(self.chunk_size)
+            )
+            if last_user_id is not None:
+                stmt = stmt.where(UserState.user_id > last_user_id)
+            async with AsyncSessionLocal() as session:
+                rows = (await session.execute(stmt)).all()
+            if not rows:
+                return
+            yield rows
+            last_user_id = rows[-1].user_id
+
+    async def rebuild(self, merge: bool = False) -> Dict:
+        token = uuid4().hex[:8]
+        live = {"score": board_key("score"), "streak": board_key("streak")}
+        staging = {board: f"{key}:staging:{token}" for board, key in live.items()}
+        progress = Progress("rebuild")
+        # Shards that received rows (the others have no staging keys)
+        filled = set()
+
+        async def write(client, rows: List):
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zadd(staging["score"], {row.user_id: row.total_score or 0 for row in rows})
+                pipe.zadd(staging["streak"], {row.user_id: row.current_streak or 0 for row in rows})
+                await pipe.execute()
+
+        async def swap(shard: int, client):
+            async with client.pipeline(transaction=True) as pipe:
+                for board, key in live.items():
+                    if shard not in filled:
+                        if not merge:
+                            pipe.delete(key)
+                    elif merge:
+                        # Members on both keep their live entry
+                        missing = f"{staging[board]}:missing"
+                        pipe.zdiffstore(missing, [staging[board], key])
+                        pipe.zunionstore(key, [key, missing])
+                        pipe.delete(missing, staging[board])
+                    else:
+                        pipe.rename(staging[board], key)
+                await pipe.execute()
+
+        try:
+            async for rows in self.stream_states():
+                groups = self.by_shard(rows)
+                await asyncio.gather(*(write(self.clients[shard], group) for shard, group in groups.items()))
+                filled.update(groups)
+                progress.advance(len(rows))
+
+            await asyncio.gather(*(swap(shard, client) for shard, client in enumerate(self.clients)))
+        except BaseException:
+            for client in self.clients:
+                await client.delete(*staging.values())
+            raise
+        await self.redis.publish(CHANGES_CHANNEL, "rebuild")
+
+        return progress.finish()
+
+    async def diff(self, sample_size: int = 20) -> Dict:
+        """Dry run: compare the live boards with ``user_state`` without writing."""
+        live = {"score": board_key("score"), "streak": board_key("streak")}
+        progress = Progress("diff")
+        missing = {"score": 0, "streak": 0}
+        mismatched = {"score": 0, "streak": 0}
+        samples: List[Dict] = []
+
+        async def fetch(client, rows: List):
+            members = [row.user_id for row in rows]
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zmscore(live["score"], members)
+                pipe.zmscore(live["streak"], members)
+                score_values, streak_values = await pipe.execute()
+            return zip(rows, score_values, streak_values)
+
+        async for rows in self.stream_states():
+            groups = self.by_shard(rows)
+            fetched = await asyncio.gather(*(fetch(self.clients[shard], group) for shard, group in groups.items()))
+
+            for row, score, streak in (entry for shard_entries in fetched for entry in shard_entries):
+                expected = {"score": row.total_score or 0, "streak": row.current_streak or 0}
+                for board, actual in (("score", score), ("streak", streak)):
+                    if actual is None:
+                        missing[board] += 1
+                    elif int(actual) != expected[board]:
+                        mismatched[board] += 1
+                    else:
+                        continue
+                    if len(samples) < sample_size:
+                        samples.append({"userId": row.user_id, "board": board, "expected": expected[board], "actual": actual})
+            progress.advance(len(rows))
+
+        score_size = streak_size = 0
+        for client in self.clients:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zcard(live["score"])
+                pipe.zcard(live["streak"])
+                shard_score_size, shard_streak_size = await pipe.execute()
+            score_size += shard_score_size
+            streak_size += shard_streak_size
+
+        report = progress.finish()
+        report.update({
+            "missing": missing,
+            "mismatched": mismatched,
+            # Members on a board without a user_state row
+            "extra": {
+                "score": score_size - (progress.rows - missing["score"]),
+                "streak": streak_size - (progress.rows - missing["streak"]),
+            },
+            "samples": samples,
+        })
+        return report
+
+class Progress:
+    def __init__(self, operation: str, log_every: int = 50_000):
+        self.operation = operation
+        self.log_every = log_every
+        self.rows = 0
+        self.started = time.perf_counter()
+        self._next_log = log_every
+
+    def advance(self, count: int):
+        self.rows += count
+        if self.rows >= self._next_log:
+            logger.info("Leaderboard progress", operation=self.operation, rows=self.rows, rows_per_sec=self.rate())
+            self._next_log += self.log_every
+
+    def rate(self) -> int:
+        elapsed = time.perf_counter() - self.started
+        return int(self.rows / elapsed) if elapsed > 0 else 0
+
+    def finish(self) -> Dict:
+        report = {
+            "operation": self.operation,
+            "rows": self.rows,
+            "seconds": round(time.perf_counter() - self.started, 3),
+            "rows_per_sec": self.rate(),
+        }
+        logger.info("Leaderboard finished", **report)
+        return report
+
+async def rebuild_weekly(board: str, day: datetime) -> str:
+    """Recompute the weekly board containing ``day`` from its daily boards.
+
+    Scores are summed, streaks take the best day: the same values the live
+    weekly boards hold, since both are fed from the floored daily score (see
+    update_boards). ZUNIONSTORE replaces the destination atomically, so
+    readers never see a partial week. With sharded boards each shard
+    rebuilds its own members' week.
+    """
+    monday = day - timedelta(days=day.weekday())
+    dailies = [board_key(board, "daily", monday + timedelta(days=i)) for i in range(7)]
+    weekly = board_key(board, "weekly", day)
+    aggregate = "SUM" if board == "score" else "MAX"
+
+    async def rebuild(client):
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.zunionstore(weekly, dailies, aggregate=aggregate)
+            pipe.expire(weekly, settings.LEADERBOARD_WEEKLY_TTL_SECONDS)
+            await pipe.execute()
+
+    redis_client = get_redis_client()
+    await asyncio.gather(*map(rebuild, leaderboard_shards.clients or [redis_client]))
+    await redis_client.publish(CHANGES_CHANNEL, "rebuild")
+    return weekly
+
+async def rebuild_if_empty():
+    """Startup hook: rebuild the boards when Redis has lost them (e.g. after a
+    restart without persistence) but Postgres still has users, or any shard
+    has lost either of them. Workers already serve answers meanwhile, so the
+    rebuild merges into the live boards rather than replacing them. A lock
+    keeps the other workers from rebuilding at the same time."""
+    redis_client = get_redis_client()
+    try:
+        clients = leaderboard_shards.clients or [redis_client]
+        existing = await asyncio.gather(*(client.exists(board_key("score"), board_key("streak")) for client in clients))
+        # EXISTS counts the keys found: both boards on every shard
+        if all(count == 2 for count in existing):
+            return
+        async with AsyncSessionLocal() as session:
+            has_users = (await session.execute(select(exists().where(UserState.user_id.isnot(None))))).scalar()
+        if not has_users:
+            return
+        if not await redis_client.set(REBUILD_LOCK_KEY, "1", ex=600, nx=True):
+            return
+        try:
+            logger.warning("Leaderboards missing in Redis, rebuilding from user_state")
+            await LeaderboardRebuilder().rebuild(merge=True)
+        finally:
+            await redis_client.delete(REBUILD_LOCK_KEY)
+    except Exception as e:
+        logger.error("Leaderboard startup rebuild failed", error=str(e))
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild or reconcile the Redis leaderboards from Postgres")
+    parser.add_argument("--dry-run", action="store_true", help="only report drift, write nothing")
+    parser.add_argument("--chunk-size", type=int, default=settings.LEADERBOARD_REBUILD_CHUNK_SIZE)
+    parser.add_argument(
+        "--weekly", nargs="?", const="today", metavar="YYYY-MM-DD",
+        help="instead, rebuild the weekly boards of the week containing this day (default today) from its daily boards",
+    )
+    args = parser.parse_args()
+
+    if args.weekly:
+        day = datetime.now(timezone.utc) if args.weekly == "today" else datetime.strptime(args.weekly, "%Y-%m-%d")
+        print({board: await rebuild_weekly(board, day) for board in ("score", "streak")})
+        return
+
+    rebuilder = LeaderboardRebuilder(chunk_size=args.chunk_size)
+    report = await (rebuilder.diff() if args.dry_run else rebuilder.rebuild())
+    print(report)
+
+if __name__ == "__main__":
+    asyncio.run(main())
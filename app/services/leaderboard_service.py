@@ -1,22 +1,154 @@
+import json
+from datetime import datetime, timezone
+from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 from app.models.user import UserState
 from app.schemas.quiz import MetricsResponse
-from app.core.redis import get_redis_client
+from app.core.config import settings
+from app.core.redis import get_redis_client, register_script
+from app.services.leaderboard_cache import leaderboard_cache
+from app.services.leaderboard_shards import leaderboard_shards
+
+# Board name -> (Redis ZSET key, score field in the response)
+BOARDS = {
+    "score": ("leaderboard:score", "score"),
+    "streak": ("leaderboard:streak", "maxStreak"),
+}
+
+# ZREVRANK plus the bounded ZREVRANGE around it, in one round trip.
+# Returns {rank, first_rank, members_with_scores}, or nil if not on the board.
+AROUND_LUA = """
+local rank = redis.call('ZREVRANK', KEYS[1], ARGV[1])
+if not rank then
+    return nil
+end
+local radius = tonumber(ARGV[2])
+local first = math.max(rank - radius, 0)
+return {rank, first, redis.call('ZREVRANGE', KEYS[1], first, rank + radius, 'WITHSCORES')}
+"""
+
+around_script = register_script(AROUND_LUA)
+
+# Pub/sub channel notified (with the user id) whenever an answer changes the
+# boards; live leaderboard streams refresh on it
+CHANGES_CHANNEL = "leaderboard:changes"
+
+# "all" is the all-time board; daily/weekly boards hold only that period's
+# activity (score gained, best streak reached) and expire on their own.
+WINDOWS = ("all", "daily", "weekly")
+
+def board_key(board: str, window: str = "all", now: Optional[datetime] = None) -> str:
+    """Redis key of a board for the period containing ``now`` (UTC)."""
+    base = BOARDS[board][0]
+    if window == "all":
+        return base
+    now = now or datetime.now(timezone.utc)
+    if window == "daily":
+        return f"{base}:daily:{now:%Y-%m-%d}"
+    year, week, _ = now.isocalendar()
+    return f"{base}:weekly:{year}-W{week:02d}"
+
+def answer_board_keys(now: datetime) -> List[str]:
+    """Every board an answer at ``now`` updates: all-time score and streak,
+    then daily/weekly score and daily/weekly streak."""
+    return [
+        board_key("score"),
+        board_key("streak"),
+        board_key("score", "daily", now),
+        board_key("score", "weekly", now),
+        board_key("streak", "daily", now),
+        board_key("streak", "weekly", now),
+    ]
+
+def resolve_board(board: str, window: str = "all") -> Tuple[str, str]:
+    if board not in BOARDS:
+        raise HTTPException(status_code=404, detail="Unknown leaderboard")
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {', '.join(WINDOWS)}")
+    return board_key(board, window), BOARDS[board][1]
+
+def clamp_page_size(limit: int) -> int:
+    return max(1, min(limit, settings.LEADERBOARD_MAX_PAGE_SIZE))
+
+async def read_page(redis_client, key: str, offset: int, limit: int) -> List[Tuple[str, float]]:
+    """(member, score) pairs ``offset`` to ``offset + limit - 1`` of a board,
+    merged across the shards when the boards are sharded."""
+    if leaderboard_shards.enabled:
+        return await leaderboard_shards.top(key, offset, limit)
+    return await redis_client.zrevrange(key, offset, offset + limit - 1, withscores=True)
 
 class LeaderboardService:
     def __init__(self, db: AsyncSession):
         self.db = db
         self.redis = get_redis_client()
 
+    async def get_leaderboard(self, board: str, limit: int = 10, offset: int = 0, window: str = "all") -> List[Dict]:
+        """Fetch one page of a board from its Redis ZSET, best first.
+
+        ``limit`` is capped at LEADERBOARD_MAX_PAGE_SIZE. ZREVRANGE is
+        O(log N + limit) whatever the offset, so deep pages stay cheap.
+        """
+        key, field = resolve_board(board, window)
+        limit = clamp_page_size(limit)
+        offset = max(offset, 0)
+        data = await read_page(self.redis, key, offset, limit)
+        return [
+            {"rank": offset + i + 1, "userId": member, field: int(score)}
+            for i, (member, score) in enumerate(data)
+        ]
+
+    async def get_leaderboard_page(self, board: str, limit: int = 10, offset: int = 0, window: str = "all") -> Tuple[bytes, Optional[int]]:
+        """Serialized page of a board and the offset of the next page (None on
+        the last page), served from the per-worker cache."""
+        limit = clamp_page_size(limit)
+        offset = max(offset, 0)
+
+        async def fetch() -> Tuple[bytes, Optional[int]]:
+            leaders = await self.get_leaderboard(board, limit, offset, window)
+            next_offset = offset + limit if len(leaders) == limit else None
+            return json.dumps(leaders, separators=(",", ":")).encode(), next_offset
+
+        return await leaderboard_cache.get_or_fetch((board, window, offset, limit), fetch)
+
+    async def get_around(self, board: str, user_id: str, radius: int = 5, window: str = "all") -> Dict:
+        """Entries ranked up to ``radius`` places above and below a user."""
+        key, field = resolve_board(board, window)
+        radius = max(0, min(radius, settings.LEADERBOARD_MAX_PAGE_SIZE // 2))
+        if leaderboard_shards.enabled:
+            return await self.get_around_sharded(key, field, user_id, radius)
+        result = await around_script(keys=[key], args=[user_id, radius], client=self.redis)
+        if result is None:
+            raise HTTPException(status_code=404, detail="User not on leaderboard")
+
+        rank, first, flat = result
+        entries = [
+            {"rank": first + i + 1, "userId": flat[2 * i], field: int(float(flat[2 * i + 1]))}
+            for i in range(len(flat) // 2)
+        ]
+        return {"userId": user_id, "rank": rank + 1, "entries": entries}
+
+    async def get_around_sharded(self, key: str, field: str, user_id: str, radius: int) -> Dict:
+        around = (await leaderboard_shards.positions([key], user_id, radius))[0]
+        if around is None:
+            raise HTTPException(status_code=404, detail="User not on leaderboard")
+        first = around.position - len(around.ahead)
+        entries = [*around.ahead, (user_id, around.score), *around.behind]
+        return {
+            "userId": user_id,
+            "rank": around.position + 1,
+            "entries": [
+                {"rank": first + i + 1, "userId": member, field: int(score)}
+                for i, (member, score) in enumerate(entries)
+            ],
+        }
+
     async def get_score_leaderboard(self, limit: int = 10) -> List[Dict]:
         """Fetch top N users by score from Redis ZSET."""
-        data = await self.redis.zrevrange("leaderboard:score", 0, limit - 1, withscores=True)
-        return [{"userId": member, "score": int(score)} for member, score in data]
+        return await self.get_leaderboard("score", limit)
 
     async def get_streak_leaderboard(self, limit: int = 10) -> List[Dict]:
         """Fetch top N users by streak from Redis ZSET."""
-        data = await self.redis.zrevrange("leaderboard:streak", 0, limit - 1, withscores=True)
-        return [{"userId": member, "maxStreak": int(score)} for member, score in data]
+        return await self.get_leaderboard("streak", limit)
@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+import zlib
+from itertools import islice
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redis import get_leaderboard_clients, register_script
+
+# Lua helper shared with the answer-recording scripts: the all-time boards
+# get the absolute score and current streak, the daily score board each
+# delta of the comma-separated ``deltas`` (floored at 0 after each one, like
+# total_score), the weekly score board what the daily one gained, and the
+# daily/weekly streak boards the best streak.
+BOARDS_LUA_HELPERS = """
+local function update_boards(member, score, streak, best_streak, deltas, daily_ttl, weekly_ttl,
+                             all_score, all_streak, daily_score, weekly_score, daily_streak, weekly_streak)
+    redis.call('ZADD', all_score, score, member)
+    redis.call('ZADD', all_streak, streak, member)
+    for delta in string.gmatch(deltas, '[^,]+') do
+        -- The daily score is floored at 0 and the weekly one gains what the
+        -- daily one did, so a week always equals the sum of its days
+        local before = tonumber(redis.call('ZSCORE', daily_score, member) or '0')
+        local after = math.max(before + tonumber(delta), 0)
+        redis.call('ZADD', daily_score, after, member)
+        redis.call('ZINCRBY', weekly_score, after - before, member)
+    end
+    redis.call('ZADD', daily_streak, 'GT', best_streak, member)
+    redis.call('ZADD', weekly_streak, 'GT', best_streak, member)
+    redis.call('EXPIRE', daily_score, daily_ttl)
+    redis.call('EXPIRE', daily_streak, daily_ttl)
+    redis.call('EXPIRE', weekly_score, weekly_ttl)
+    redis.call('EXPIRE', weekly_streak, weekly_ttl)
+end
+"""
+
+# KEYS: all-time score, all-time streak, daily score, weekly score, daily
+# streak, weekly streak. ARGV: the update_boards arguments.
+UPDATE_BOARDS_LUA = BOARDS_LUA_HELPERS + """
+update_boards(ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5], ARGV[6], ARGV[7], unpack(KEYS))
+return 1
+"""
+
+# Position of (score ARGV[1], member ARGV[2]) in this shard's ZREVRANGE order
+# (score, then member, descending): members scoring higher, plus the tied
+# members sorting after it bytewise, found by binary search over the tie
+# run. With ARGV[3] = radius > 0 the members just ahead of and behind that
+# position are returned too (the member itself is skipped).
+SHARD_POSITION_LUA = """
+local function less(a, b)
+    for i = 1, math.min(#a, #b) do
+        local x, y = string.byte(a, i), string.byte(b, i)
+        if x ~= y then
+            return x < y
+        end
+    end
+    return #a < #b
+end
+local lo = redis.call('ZCOUNT', KEYS[1], '(' .. ARGV[1], '+inf')
+local hi = lo + redis.call('ZCOUNT', KEYS[1], ARGV[1], ARGV[1])
+while lo < hi do
+    local mid = math.floor((lo + hi) / 2)
+    if less(ARGV[2], redis.call('ZREVRANGE', KEYS[1], mid, mid)[1]) then
+        lo = mid + 1
+    else
+        hi = mid
+    end
+end
+local radius = tonumber(ARGV[3])
+if radius == 0 then
+    return {lo}
+end
+local behind = lo
+if redis.call('ZREVRANGE', KEYS[1], lo, lo)[1] == ARGV[2] then
+    behind = lo + 1
+end
+return {
+    lo,
+    lo > 0 and redis.call('ZREVRANGE', KEYS[1], math.max(lo - radius, 0), lo - 1, 'WITHSCORES') or {},
+    redis.call('ZREVRANGE', KEYS[1], behind, behind + radius - 1, 'WITHSCORES'),
+}
+"""
+
+update_boards_script = register_script(UPDATE_BOARDS_LUA)
+shard_position_script = register_script(SHARD_POSITION_LUA)
+
+Entry = Tuple[str, float]
+
+class Around(NamedTuple):
+    """A member's 0-based position and score, and its neighbours, best first."""
+    position: int
+    score: float
+    ahead: List[Entry]
+    behind: List[Entry]
+
+def pairs(flat: List[str]) -> List[Entry]:
+    return [(flat[i], float(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+def order_key(entry: Entry) -> Tuple[float, str]:
+    # ZREVRANGE order: score, then member, descending (str order is byte order for UTF-8)
+    return entry[1], entry[0]
+
+class LeaderboardShards:
+    """Leaderboard ZSETs spread over several Redis instances.
+
+    Every board key exists on every shard; a member lives on the shard
+    ``crc32(user_id) % N`` and only that shard is written for it. Reads
+    scatter to all shards concurrently and gather:
+
+    * pages: each shard's top ``offset + limit`` merged with a k-way heap
+      merge, so deep pages cost O(shards * (offset + limit));
+    * ranks: the member's score from its own shard, then on every shard the
+      members scoring higher plus the tied ones ordered ahead of it, which
+      sums to exactly the single-instance ZREVRANK.
+
+    Changing ``LEADERBOARD_REDIS_URLS`` moves members between shards: rebuild
+    the boards afterwards (``python -m app.services.leaderboard_rebuild``).
+    """
+
+    def __init__(self, clients: List):
+        self.clients = clients
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.clients)
+
+    def shard_of(self, user_id: str) -> int:
+        return zlib.crc32(str(user_id).encode()) % len(self.clients)
+
+    def owner(self, user_id: str):
+        return self.clients[self.shard_of(user_id)]
+
+    def group(self, user_ids: List[str]) -> Dict[int, List[str]]:
+        """``user_ids`` by shard index."""
+        groups: Dict[int, List[str]] = {}
+        for user_id in user_ids:
+            groups.setdefault(self.shard_of(user_id), []).append(user_id)
+        return groups
+
+    async def record(self, keys: List[str], user_id: str, total_score: int, streak: int, best_streak: int, deltas: List[int]):
+        """Apply one user's answers to their shard's boards (see BOARDS_LUA_HELPERS)."""
+        args = [
+            str(user_id),
+            total_score,
+            streak,
+            best_streak,
+            ",".join(str(delta) for delta in deltas),
+            settings.LEADERBOARD_DAILY_TTL_SECONDS,
+            settings.LEADERBOARD_WEEKLY_TTL_SECONDS,
+        ]
+        await update_boards_script(keys=keys, args=args, client=self.owner(user_id))
+
+    async def top(self, key: str, offset: int, limit: int) -> List[Entry]:
+        """Entries ``offset`` to ``offset + limit - 1`` of the merged board."""
+        pages = await asyncio.gather(*(
+            client.zrevrange(key, 0, offset + limit - 1, withscores=True) for client in self.clients
+        ))
+        return list(islice(heapq.merge(*pages, key=order_key, reverse=True), offset, offset + limit))
+
+    async def positions(self, keys: List[str], user_id: str, radius: int = 0) -> List[Optional[Around]]:
+        """The member's position on each board (None where it has no score),
+        with up to ``radius`` neighbours each side when ``radius`` > 0."""
+        async with self.owner(user_id).pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.zscore(key, str(user_id))
+            scores = await pipe.execute()
+
+        calls = [
+            shard_position_script(keys=[key], args=[repr(score), str(user_id), radius], client=client)
+            for key, score in zip(keys, scores) if score is not None
+            for client in self.clients
+        ]
+        results = iter(await asyncio.gather(*calls))
+
+        positions: List[Optional[Around]] = []
+        for score in scores:
+            if score is None:
+                positions.append(None)
+                continue
+            shards = [next(results) for _ in self.clients]
+            position = sum(shard[0] for shard in shards)
+            if not radius:
+                positions.append(Around(position, score, [], []))
+                continue
+            ahead = list(heapq.merge(*(pairs(shard[1]) for shard in shards), key=order_key, reverse=True))
+            behind = heapq.merge(*(pairs(shard[2]) for shard in shards), key=order_key, reverse=True)
+            positions.append(Around(position, score, ahead[max(len(ahead) - radius, 0):], list(islice(behind, radius))))
+        return positions
+
+    async def ranks(self, keys: List[str], user_id: str) -> List[Optional[int]]:
+        """0-based ranks, like ZREVRANK on a single instance."""
+        return [p.position if p else None for p in await self.positions(keys, user_id)]
+
+leaderboard_shards = LeaderboardShards(get_leaderboard_clients())
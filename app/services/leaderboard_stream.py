@@ -0,0 +1,210 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.core.metrics import Gauge, register
+from app.core.redis import get_redis_client
+from app.services.leaderboard_service import (
+    BOARDS, CHANGES_CHANNEL, board_key, clamp_page_size, read_page, resolve_board,
+)
+
+logger = structlog.get_logger()
+
+def sse(event: str, data: Dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+KEEPALIVE = b": keepalive\n\n"
+
+class Topic:
+    """The top ``limit`` of one board/window and the queues of the streams
+    watching it."""
+
+    def __init__(self, board: str, window: str, limit: int):
+        self.board = board
+        self.window = window
+        self.limit = limit
+        self.field = BOARDS[board][1]
+        self.entries: Optional[List[Tuple[str, int]]] = None
+        self.queues: Set[asyncio.Queue] = set()
+
+    def rows(self, entries: List[Tuple[str, int]], ranks) -> List[Dict]:
+        return [{"rank": rank + 1, "userId": entries[rank][0], self.field: entries[rank][1]} for rank in ranks]
+
+    def snapshot(self) -> bytes:
+        return sse("snapshot", {"entries": self.rows(self.entries, range(len(self.entries))), "size": len(self.entries)})
+
+    def diff(self, entries: List[Tuple[str, int]]) -> Optional[bytes]:
+        """Frame with the ranks whose entry changed (the client then truncates
+        to ``size``), or None if nothing did."""
+        changed = [rank for rank, entry in enumerate(entries) if rank >= len(self.entries) or self.entries[rank] != entry]
+        if not changed and len(entries) == len(self.entries):
+            return None
+        return sse("diff", {"entries": self.rows(entries, changed), "size": len(entries)})
+
+class LeaderboardStream:
+    """Per-worker fan-out of live leaderboard updates (Server-Sent Events).
+
+    The worker holds one pub/sub subscription to CHANGES_CHANNEL, started with
+    the first stream. A notification marks the boards dirty; at most once per
+    ``debounce`` the top of every watched board is read once (one page per
+    board key, sized for its largest watcher) and each topic's diff is
+    serialized once and queued to all of its streams. A stream whose queue
+    is full is dropped back to a fresh snapshot instead of buffering more.
+    """
+
+    def __init__(self, debounce: float, keepalive: float, queue_size: int):
+        self.debounce = debounce
+        self.keepalive = keepalive
+        self.queue_size = queue_size
+        self._topics: Dict[Tuple[str, str, int], Topic] = {}
+        self._dirty = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.notifications = 0
+        self.refreshes = 0
+        self.frames = 0
+        self.resyncs = 0
+
+    @property
+    def streams(self) -> int:
+        return sum(len(topic.queues) for topic in self._topics.values())
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._refresh_loop())]
+            logger.info("Leaderboard stream started", channel=CHANGES_CHANNEL, debounce=self.debounce)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _listen(self):
+        while True:
+            try:
+                async with get_redis_client().pubsub() as pubsub:
+                    await pubsub.subscribe(CHANGES_CHANNEL)
+                    # Changes may have been missed while (re)subscribing
+                    self._dirty.set()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.notifications += 1
+                            self._dirty.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Leaderboard stream subscription lost, retrying", error=str(e))
+                await asyncio.sleep(1)
+
+    async def _refresh_loop(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.debounce)
+            self._dirty.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Leaderboard stream refresh failed", error=str(e))
+
+    async def fetch(self, keys: Dict[str, int]) -> Dict[str, List[Tuple[str, int]]]:
+        """Top ``limit`` of each board key, one read per key."""
+        redis_client = get_redis_client()
+        pages = await asyncio.gather(*(read_page(redis_client, key, 0, limit) for key, limit in keys.items()))
+        return {key: [(member, int(score)) for member, score in page] for key, page in zip(keys, pages)}
+
+    async def refresh(self):
+        topics = [topic for topic in self._topics.values() if topic.entries is not None]
+        if not topics:
+            return
+        # Resolved on every refresh so daily/weekly streams roll over
+        keys: Dict[str, int] = {}
+        for topic in topics:
+            key = board_key(topic.board, topic.window)
+            keys[key] = max(keys.get(key, 0), topic.limit)
+        pages = await self.fetch(keys)
+        self.refreshes += 1
+
+        for topic in topics:
+            entries = pages[board_key(topic.board, topic.window)][:topic.limit]
+            frame = topic.diff(entries)
+            topic.entries = entries
+            if frame is not None:
+                for queue in topic.queues:
+                    self.push(topic, queue, frame)
+
+    def push(self, topic: Topic, queue: asyncio.Queue, frame: bytes):
+        try:
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # The client fell behind: replace its backlog with the current board
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(topic.snapshot())
+            self.resyncs += 1
+            return
+        self.frames += 1
+
+    def open(self, board: str, window: str = "all", limit: int = 10) -> AsyncIterator[bytes]:
+        """Validate the board and return the stream's SSE frames: a snapshot,
+        then diffs as the board changes, with keepalive comments between."""
+        resolve_board(board, window)
+        return self._events(board, window, clamp_page_size(limit))
+
+    async def _events(self, board: str, window: str, limit: int) -> AsyncIterator[bytes]:
+        self.start()
+        name = (board, window, limit)
+        topic = self._topics.setdefault(name, Topic(board, window, limit))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        topic.queues.add(queue)
+        try:
+            if topic.entries is None:
+                key = board_key(board, window)
+                entries = (await self.fetch({key: limit}))[key]
+                # Keep a snapshot a concurrent opener or refresh stored meanwhile,
+                # since the diffs queued to other streams are relative to it
+                if topic.entries is None:
+                    topic.entries = entries
+            # Diffs queued so far are already in the snapshot
+            while not queue.empty():
+                queue.get_nowait()
+            yield topic.snapshot()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    frame = KEEPALIVE
+                yield frame
+        finally:
+            topic.queues.discard(queue)
+            if not topic.queues and self._topics.get(name) is topic:
+                del self._topics[name]
+
+leaderboard_stream = LeaderboardStream(
+    debounce=settings.LEADERBOARD_STREAM_DEBOUNCE_MS / 1000,
+    keepalive=settings.LEADERBOARD_STREAM_KEEPALIVE_S,
+    queue_size=settings.LEADERBOARD_STREAM_QUEUE_SIZE,
+)
+
+register(Gauge(
+    "brainbolt_leaderboard_streams",
+    "Live leaderboard streams open on this worker",
+    (),
+    lambda: {(): leaderboard_stream.streams},
+))
+
+register(Gauge(
+    "brainbolt_leaderboard_stream_events_total",
+    "Leaderboard stream activity by event: change notifications received, "
+    "board refreshes, frames queued and slow clients resynced",
+    ("event",),
+    lambda: {
+        ("notification",): leaderboard_stream.notifications,
+        ("refresh",): leaderboard_stream.refreshes,
+        ("frame",): leaderboard_stream.frames,
+        ("resync",): leaderboard_stream.resyncs,
+    },
+    kind="counter",
+))
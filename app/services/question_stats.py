@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import exists, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import structlog
+
+from app.models.question import QuestionStat
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import Gauge, register
+from app.core.redis import get_redis_client, register_script
+from app.data.questions import question_repo, normalize_answer, Question
+from app.services.answer_stream import AnswerEvent, ConsumerGroupWorker, StreamConsumer
+
+logger = structlog.get_logger()
+
+# Unflushed counters, field "{counter}:{questionId}"; renamed to FLUSHING_KEY
+# (with a batch id in FLUSH_ID_KEY) while a flush copies them to Postgres
+LIVE_KEY = "question_stats:live"
+FLUSHING_KEY = "question_stats:flushing"
+FLUSH_ID_KEY = "question_stats:flushing:id"
+FLUSH_LOCK_KEY = "question_stats:flush_lock"
+# Stream ID of the last answer event counted
+WATERMARK_KEY = "question_stats:consumed"
+
+# Counts answer events into LIVE_KEY. KEYS: LIVE_KEY, WATERMARK_KEY. ARGV: per
+# event its stream ID, question id, '1' if correct and choice counter. Events
+# at or below the watermark were already counted (a redelivered batch).
+COUNT_LUA = """
+local function after(a, b)
+    local a_ms, a_seq = string.match(a, '(%d+)-(%d+)')
+    local b_ms, b_seq = string.match(b, '(%d+)-(%d+)')
+    a_ms, b_ms = tonumber(a_ms), tonumber(b_ms)
+    return a_ms > b_ms or (a_ms == b_ms and tonumber(a_seq) > tonumber(b_seq))
+end
+local watermark = redis.call('GET', KEYS[2]) or '0-0'
+for i = 1, #ARGV, 4 do
+    if after(ARGV[i], watermark) then
+        local question = ARGV[i + 1]
+        redis.call('HINCRBY', KEYS[1], 'attempts:' .. question, 1)
+        if ARGV[i + 2] == '1' then
+            redis.call('HINCRBY', KEYS[1], 'correct:' .. question, 1)
+        end
+        redis.call('HINCRBY', KEYS[1], ARGV[i + 3] .. ':' .. question, 1)
+        watermark = ARGV[i]
+    end
+end
+redis.call('SET', KEYS[2], watermark)
+return 1
+"""
+
+# Starts a flush: moves LIVE_KEY to FLUSHING_KEY under the batch id ARGV[1],
+# unless an earlier flush was interrupted, in which case its batch is resumed.
+# Returns the batch id, or nil when there is nothing to flush.
+TAKE_BATCH_LUA = """
+local pending = redis.call('GET', KEYS[3])
+if pending and redis.call('EXISTS', KEYS[2]) == 1 then
+    return pending
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('SET', KEYS[3], ARGV[1])
+return ARGV[1]
+"""
+
+count_script = register_script(COUNT_LUA)
+take_batch_script = register_script(TAKE_BATCH_LUA)
+
+def choice_counter(question: Optional[Question], answer: str) -> str:
+    """Counter for the picked choice. Answers that match none of the choices
+    share one counter, so clients can't grow the hash."""
+    if question is not None:
+        normalized = normalize_answer(answer)
+        for i, choice in enumerate(question.choices):
+            if normalize_answer(choice) == normalized:
+                return f"choice{i}"
+    return "choice_other"
+
+def parse_counters(fields: Dict[str, str]) -> Dict[Tuple[str, str], int]:
+    """(question id, counter) -> value from a counters hash."""
+    counters = {}
+    for field, value in fields.items():
+        counter, question_id = field.split(":", 1)
+        counters[(question_id, counter)] = int(value)
+    return counters
+
+class QuestionStatsConsumer(StreamConsumer):
+    """Per-question answer counters fed from the answer stream: attempts,
+    correct answers and picks per choice, one script call per batch."""
+
+    group = "question_stats"
+
+    def __init__(self):
+        self.redis = get_redis_client()
+
+    async def handle(self, events: List[Tuple[str, AnswerEvent]]):
+        args = []
+        for entry_id, event in events:
+            question = question_repo.get_question_by_id(event.question_id)
+            args.extend((entry_id, event.question_id, "1" if event.correct else "0", choice_counter(question, event.answer)))
+        await count_script(keys=[LIVE_KEY, WATERMARK_KEY], args=args, client=self.redis)
+
+class QuestionStatsFlusher:
+    """Periodically adds the Redis counters to the ``question_stats`` table.
+
+    A flush renames the live hash (new answers start a fresh one), upserts
+    its values as increments tagged with the batch id, then deletes it. If
+    the worker dies in between, the next flush resumes the same batch and
+    skips the upsert when rows already carry its id, so nothing is counted
+    twice. A Redis lock keeps flushes from running concurrently.
+    """
+
+    def __init__(self, interval: float = settings.QUESTION_STATS_FLUSH_INTERVAL_S):
+        self.interval = interval
+        self.redis = get_redis_client()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Question stats flusher started", interval=self.interval)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Question stats flush failed", error=str(e))
+
+    async def flush(self) -> int:
+        """Flush one batch; returns the number of counters written."""
+        if not await self.redis.set(FLUSH_LOCK_KEY, "1", ex=max(int(self.interval), 60), nx=True):
+            return 0
+        try:
+            batch = await take_batch_script(keys=[LIVE_KEY, FLUSHING_KEY, FLUSH_ID_KEY], args=[str(uuid4())], client=self.redis)
+            if batch is None:
+                return 0
+            counters = parse_counters(await self.redis.hgetall(FLUSHING_KEY))
+            async with AsyncSessionLocal() as session:
+                done = (await session.execute(select(exists().where(QuestionStat.flush_id == batch)))).scalar()
+                if counters and not done:
+                    now = datetime.now(timezone.utc)
+                    stmt = pg_insert(QuestionStat).values([
+                        {"question_id": question_id, "counter": counter, "value": value, "flush_id": batch, "updated_at": now}
+                        for (question_id, counter), value in counters.items()
+                    ])
+                    await session.execute(stmt.on_conflict_do_update(
+                        index_elements=[QuestionStat.question_id, QuestionStat.counter],
+                        set_={
+                            "value": QuestionStat.value + stmt.excluded.value,
+                            "flush_id": stmt.excluded.flush_id,
+                            "updated_at": stmt.excluded.updated_at,
+                        },
+                    ))
+                    await session.commit()
+            await self.redis.delete(FLUSHING_KEY, FLUSH_ID_KEY)
+            self.flushes += 1
+            return len(counters)
+        finally:
+            await self.redis.delete(FLUSH_LOCK_KEY)
+
+async def question_stats(session: AsyncSession) -> Dict:
+    """Per-question and per-difficulty answer statistics: the Postgres rollup
+    plus the counters not flushed yet, O(questions) whatever the number of
+    submissions. Redis is read first, so a flush finishing in between shows
+    up as rows tagged with the flushing batch instead of being counted twice."""
+    redis_client = get_redis_client()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hgetall(LIVE_KEY)
+        pipe.hgetall(FLUSHING_KEY)
+        pipe.get(FLUSH_ID_KEY)
+        live, flushing, batch = await pipe.execute()
+    rows = (await session.execute(select(QuestionStat.question_id, QuestionStat.counter, QuestionStat.value, QuestionStat.flush_id))).all()
+
+    counters: Dict[Tuple[str, str], int] = defaultdict(int)
+    flushed = any(row.flush_id == batch for row in rows) if batch else False
+    for row in rows:
+        counters[(row.question_id, row.counter)] += row.value
+    pending = [live] if flushed else [live, flushing]
+    for fields in pending:
+        for key, value in parse_counters(fields).items():
+            counters[key] += value
+
+    questions, difficulties = [], {}
+    for question in question_repo.get_all_questions():
+        attempts = counters.get((question.id, "attempts"), 0)
+        correct = counters.get((question.id, "correct"), 0)
+        picks = {choice: counters.get((question.id, f"choice{i}"), 0) for i, choice in enumerate(question.choices)}
+        questions.append({
+            "questionId": question.id,
+            "difficulty": question.difficulty,
+            "attempts": attempts,
+            "correct": correct,
+            "accuracy": correct / attempts if attempts else None,
+            "picks": picks,
+            "otherPicks": counters.get((question.id, "choice_other"), 0),
+        })
+        level = difficulties.setdefault(question.difficulty, {"difficulty": question.difficulty, "questions": 0, "attempts": 0, "correct": 0})
+        level["questions"] += 1
+        level["attempts"] += attempts
+        level["correct"] += correct
+
+    for level in difficulties.values():
+        level["accuracy"] = level["correct"] / level["attempts"] if level["attempts"] else None
+    return {"questions": questions, "difficulties": [difficulties[d] for d in sorted(difficulties)]}
+
+question_stats_consumer = ConsumerGroupWorker(QuestionStatsConsumer())
+question_stats_flusher = QuestionStatsFlusher()
+
+register(Gauge(
+    "brainbolt_question_stats_flushes_total",
+    "Batches of per-question answer counters flushed to Postgres by this worker",
+    (),
+    lambda: {(): question_stats_flusher.flushes},
+    kind="counter",
+))
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Run the question stats consumer and flusher outside the web workers, or flush once"
+    )
+    parser.add_argument("--flush", action="store_true", help="Flush the pending counters to Postgres and exit")
+    args = parser.parse_args()
+    if args.flush:
+        print({"counters": await question_stats_flusher.flush()})
+        return
+    question_stats_consumer.start()
+    question_stats_flusher.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await question_stats_consumer.stop()
+        await question_stats_flusher.stop()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
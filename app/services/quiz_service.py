@@ -1,45 +1,237 @@
 from datetime import datetime, timezone, timedelta
 from uuid import uuid4
+import asyncio
 import random
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, exists, union_all, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
-from fastapi import HTTPException
+from sqlalchemy.orm.exc import StaleDataError
+from fastapi import HTTPException, Response
 import structlog
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 
 from app.models.user import User, UserState, UserSubmission
-from app.data.questions import question_repo, Question
-from app.schemas.quiz import QuestionResponse, AnswerRequest, AnswerResponse, MetricsResponse
-from app.core.redis import get_redis_client
+from app.data.questions import question_repo, Question, normalize_answer
+from app.schemas.quiz import (
+    QuestionResponse, QuestionBatchResponse, AnswerRequest, AnswerResponse, MetricsResponse,
+    BulkAnswerRequest, BulkAnswerResponse, BulkAnswerResult,
+)
+from app.core.config import settings
+from app.core.database import replica_engine, recent_write_key, pick_session
+from app.core.redis import get_redis_client, register_script
+from app.core.metrics import timed
+from app.services import scoring
+from app.services.scoring import ScoreState
+from app.services.answered_service import AnsweredService
+from app.services.submission_writer import submission_writer
+from app.services.state_cache import UserStateCache, PUT_STATE_LUA_TEMPLATE
+from app.services.leaderboard_service import board_key, answer_board_keys, CHANGES_CHANNEL
+from app.services.rank_histogram import rank_histogram, RANK_MODES
+from app.services.leaderboard_shards import leaderboard_shards, BOARDS_LUA_HELPERS
+from app.services.answer_stream import ANSWER_STREAM_KEY, AnswerEvent
+from app.services.idempotency import (
+    IdempotencyStore, IdempotencyClaim, IdempotencySlot, IDEMPOTENCY_LUA_HELPERS, is_inflight, pack_response, unpack_response,
+)
 
 logger = structlog.get_logger()
 
+# Outcomes of RECORD_ANSWER_LUA
+RECORDED = 1
+KEY_USED = 0
+BITMAP_INCOMPLETE = -1
+ALREADY_ANSWERED = -2
+
+# The Redis writes for one answer that must precede its commit, atomically.
+# Returns KEY_USED without writing anything unless the idempotency entry
+# (KEYS[1], field ARGV[2]) still holds this request's in-flight marker
+# ARGV[1]. With ARGV[3] == '1' the answered bitmap KEYS[2] is also the
+# duplicate guard: a missing sentinel bit (ARGV[4]) or an already-set question
+# bit aborts. Otherwise the question bit ARGV[5] is set and, with ARGV[7] > 0,
+# the user's read-your-writes marker KEYS[3] for that many ms. Everything
+# else waits for the commit (COMPLETE_ANSWERS_LUA).
+RECORD_ANSWER_LUA = IDEMPOTENCY_LUA_HELPERS + """
+if ARGV[3] == '1' and redis.call('GETBIT', KEYS[2], ARGV[4]) == 0 then
+    return -1
+end
+if idem_get(KEYS[1], ARGV[2]) ~= ARGV[1] then
+    return 0
+end
+if ARGV[3] == '1' and redis.call('GETBIT', KEYS[2], ARGV[5]) == 1 then
+    return -2
+end
+redis.call('SETBIT', KEYS[2], ARGV[5], 1)
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+if tonumber(ARGV[7]) > 0 then
+    redis.call('SET', KEYS[3], '1', 'PX', ARGV[7])
+end
+return 1
+"""
+
+record_answer_script = register_script(RECORD_ANSWER_LUA)
+
+# RECORD_ANSWER_LUA for an in-order batch of answers by one user, which has
+# not claimed its n idempotency entries (KEYS[3..], fields ARGV[8 + i]) yet:
+# returns KEY_USED if any of them is set (expired markers don't count, ARGV[8]
+# is now in ms), else sets them all to the in-flight marker ARGV[6] (ARGV[7]:
+# marker ttl ms, ARGV[9 + n]: bucket expire-at).
+# ARGV[1] is the guard flag, ARGV[2] the sentinel bit, ARGV[3] the
+# comma-separated question indexes to set, ARGV[4] the bitmap TTL and ARGV[5]
+# the read-your-writes ms.
+RECORD_ANSWERS_LUA = IDEMPOTENCY_LUA_HELPERS + """
+local n = #KEYS - 2
+if ARGV[1] == '1' and redis.call('GETBIT', KEYS[1], ARGV[2]) == 0 then
+    return -1
+end
+for i = 1, n do
+    if idem_live(KEYS[2 + i], ARGV[8 + i], ARGV[8]) then
+        return 0
+    end
+end
+if ARGV[1] == '1' then
+    for index in string.gmatch(ARGV[3], '[^,]+') do
+        if redis.call('GETBIT', KEYS[1], index) == 1 then
+            return -2
+        end
+    end
+end
+for i = 1, n do
+    idem_mark(KEYS[2 + i], ARGV[8 + i], ARGV[6], ARGV[7], ARGV[9 + n])
+end
+for index in string.gmatch(ARGV[3], '[^,]+') do
+    redis.call('SETBIT', KEYS[1], index, 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+if tonumber(ARGV[5]) > 0 then
+    redis.call('SET', KEYS[2], '1', 'PX', ARGV[5])
+end
+return 1
+"""
+
+record_answers_script = register_script(RECORD_ANSWERS_LUA)
+
+# The Redis writes that follow the commit of n answers by one user, in one
+# atomic call. Each idempotency entry KEYS[8 + i] (field ARGV[11 + i]) still
+# holding the in-flight marker ARGV[11] gets its packed response
+# ARGV[11 + n + i], expiring at ARGV[10]. With the boards flag ARGV[1] == '1'
+# (see boards_flag) the six boards KEYS[1..6] (answer_board_keys order) get
+# the update_boards arguments ARGV[2..8] and CHANGES_CHANNEL is notified. The
+# packed events ARGV[11 + 2n + i] go to the answer stream KEYS[8], trimmed to
+# ~ARGV[9], and the state cache KEYS[7] gets the state put args that follow.
+COMPLETE_ANSWERS_LUA = IDEMPOTENCY_LUA_HELPERS + BOARDS_LUA_HELPERS + """
+local n = #KEYS - 8
+for i = 1, n do
+    if idem_get(KEYS[8 + i], ARGV[11 + i]) == ARGV[11] then
+        idem_set(KEYS[8 + i], ARGV[11 + i], ARGV[11 + n + i], ARGV[10])
+    end
+end
+if ARGV[1] == '1' then
+    update_boards(ARGV[2], ARGV[3], ARGV[4], ARGV[5], ARGV[6], ARGV[7], ARGV[8],
+                  KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6])
+    redis.call('PUBLISH', '""" + CHANGES_CHANNEL + """', ARGV[2])
+end
+for i = 1, n do
+    redis.call('XADD', KEYS[8], 'MAXLEN', '~', ARGV[9], '*', 'e', ARGV[11 + 2 * n + i])
+end
+local v = 12 + 3 * n
+""" + PUT_STATE_LUA_TEMPLATE.format(key_index=7, version_index="v") + """
+return 1
+"""
+
+complete_answers_script = register_script(COMPLETE_ANSWERS_LUA)
+
+def boards_flag() -> str:
+    """'1' when the completion script updates the boards itself: in sync mode
+    with the boards on the main Redis. Sharded boards are written by
+    record_on_shard, and in async mode by the leaderboard projector."""
+    return "1" if settings.LEADERBOARD_UPDATE_MODE == "sync" and not leaderboard_shards.enabled else "0"
+
+def answer_event(state: UserState, question: Question, answer: str, response: AnswerResponse, now: datetime) -> str:
+    return AnswerEvent(
+        str(state.user_id), question.id, answer, response.correct, response.scoreDelta,
+        response.totalScore, response.newStreak, int(now.timestamp() * 1000),
+    ).pack()
+
 class QuizService:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None):
         self.db = db
+        # Replica session for read-only queries, see pick_session
+        self.read_db = read_db
+        self.redis = get_redis_client()
 
-    async def get_or_create_user(self, user_id: Optional[str] = None) -> User:
-        if user_id:
-            result = await self.db.execute(select(User).where(User.id == user_id))
-            user = result.scalars().first()
-            if user:
-                return user
-        
-        # Create new user if not found or no ID provided
+    @staticmethod
+    def read_your_writes_ms() -> int:
+        # No marker needed when every read already goes to the primary
+        return settings.READ_YOUR_WRITES_MS if replica_engine is not None else 0
+
+    def get_or_create_statement(self, user_id: str, now: datetime):
+        """One statement creating the user and state rows if missing and
+        returning the state, with a ``created`` flag.
+
+        Both inserts are ON CONFLICT DO NOTHING CTEs. The main query can't see
+        rows inserted by its own CTEs, so the UNION ALL yields the new state
+        row or the existing one, never both.
+        """
+        user_state = UserState.__table__
+        new_user = (
+            pg_insert(User)
+            .values(id=user_id, created_at=now)
+            .on_conflict_do_nothing(index_elements=[User.id])
+            .returning(User.id)
+            .cte("new_user")
+        )
+        # Not gated on new_user, so a user left without a state row gets one.
+        # The foreign key is checked at the end of the statement, after new_user.
+        new_state = (
+            pg_insert(user_state)
+            .values(
+                user_id=user_id,
+                current_difficulty=1.0,
+                current_streak=0,
+                max_streak=0,
+                total_score=0,
+                daily_attempts=0,
+                daily_correct=0,
+                updated_at=now,
+                last_activity_date=now,
+                version=0
+            )
+            .on_conflict_do_nothing(index_elements=[user_state.c.user_id])
+            .returning(*user_state.c)
+            .cte("new_state")
+        )
+        return union_all(
+            select(new_state, literal(True).label("created")),
+            select(user_state, literal(False).label("created")).where(user_state.c.user_id == user_id),
+        ).add_cte(new_user)
+
+    async def get_or_create_user(self, user_id: Optional[str] = None) -> UserState:
+        """Return the user's state, creating the user and state rows if needed,
+        in one round trip. The caller commits.
+
+        A concurrent first request for the same id can leave the statement
+        empty (its insert waited on ours and did nothing, but its snapshot
+        predates our commit), so an empty result is retried once.
+        """
         # Use provided ID if available, else generate new UUID string
-        new_id = user_id if user_id else str(uuid4())
-        new_user = User(id=new_id)
-        self.db.add(new_user)
-        # Initialize state
-        new_state = UserState(user_id=new_user.id)
-        self.db.add(new_state)
-        await self.db.commit()
-        await self.db.refresh(new_user)
-        return new_user
-
-    async def get_user_state(self, user_id: str) -> UserState:
-        result = await self.db.execute(select(UserState).where(UserState.user_id == user_id))
+        user_id = user_id or str(uuid4())
+        stmt = self.get_or_create_statement(user_id, datetime.now(timezone.utc))
+        row = (await self.db.execute(stmt)).first()
+        if row is None:
+            row = (await self.db.execute(stmt)).first()
+        if row is None:
+            logger.error("User upsert returned no state", user_id=user_id)
+            raise HTTPException(status_code=500, detail="Internal Server Error")
+
+        values = dict(row._mapping)
+        if values.pop("created") and self.read_your_writes_ms():
+            # The replica may not have the new rows yet
+            await self.redis.set(recent_write_key(user_id), "1", px=self.read_your_writes_ms())
+        # Transient copy, like the fast submit path
+        return UserState(**values)
+
+    async def get_user_state(self, user_id: str, db: Optional[AsyncSession] = None) -> UserState:
+        result = await (db or self.db).execute(select(UserState).where(UserState.user_id == user_id))
         state = result.scalars().first()
         if not state:
             raise HTTPException(status_code=404, detail="User state not found")
@@ -47,73 +239,294 @@ class QuizService:
 
     async def check_streak_decay(self, state: UserState):
         """Halve streak if more than 24 hours since last update."""
-        if not state.updated_at:
-            return
-
-        now = datetime.now(timezone.utc)
-        last_update = state.updated_at
-        if last_update.tzinfo is None:
-            last_update = last_update.replace(tzinfo=timezone.utc)
-            
-        hours_diff = (now - last_update).total_seconds() / 3600
-        if hours_diff >= 24:
+        streak = scoring.decayed_streak(state.current_streak, state.updated_at, datetime.now(timezone.utc))
+        if streak != state.current_streak:
             logger.info("Applying streak decay", user_id=str(state.user_id), old_streak=state.current_streak)
-            state.current_streak = int(state.current_streak / 2)
+            state.current_streak = streak
 
     async def get_next_question(self, user_id: Optional[str]) -> QuestionResponse:
-        user = await self.get_or_create_user(user_id)
-        state = await self.get_user_state(user.id)
+        with timed("get_next_question", "db"):
+            state = await self.get_or_create_user(user_id)
         
         # Determine difficulty
         current_diff = int(state.current_difficulty)
         
-        # Fetch question pool
-        pool = question_repo.get_questions_by_difficulty(current_diff)
-        if not pool:
-            pool = question_repo.get_all_questions()
+        # Pick an unanswered question from the user's answered bitmap
+        answered = AnsweredService(self.db, read_db=self.read_db)
+        with timed("get_next_question", "redis"):
+            picked = await answered.pick_unanswered(state.user_id, current_diff)
         
-        # Filter out already submitted questions
-        result = await self.db.execute(select(UserSubmission.question_id).where(UserSubmission.user_id == user.id))
-        answered_ids = set(result.scalars().all())
+        # Everything answered: allow repeats from the whole bank
+        question = picked[0] if picked else random.choice(question_repo.get_all_questions())
+        if settings.QUIZ_REQUIRE_ISSUED:
+            # Added to the batch's issued set, so both kinds of client can answer
+            with timed("get_next_question", "redis"):
+                await answered.record_issued(state.user_id, [question], replace=False)
         
-        available_pool = [q for q in pool if q.id not in answered_ids]
+        # Update state with this being the "current" question
+        with timed("get_next_question", "db"):
+            await self.db.execute(
+                update(UserState.__table__)
+                .where(UserState.user_id == state.user_id)
+                .values(last_question_id=question.id)
+            )
+            await self.db.commit()
         
-        if not available_pool:
-            # If no questions at current difficulty, try all questions
-            all_questions = question_repo.get_all_questions()
-            available_pool = [q for q in all_questions if q.id not in answered_ids]
+        with timed("get_next_question", "serialization"):
+            return QuestionResponse(
+                userId=state.user_id,
+                questionId=question.id,
+                difficulty=question.difficulty,
+                prompt=question.prompt,
+                choices=list(question.choices)
+            )
 
-        if not available_pool:
-             available_pool = question_repo.get_all_questions()
+    async def get_next_batch(self, user_id: Optional[str], count: int) -> QuestionBatchResponse:
+        """The next ``count`` questions, picked like get_next_question, plus up
+        to ``count`` unanswered alternates one difficulty below and above,
+        none of them repeating a question of the batch.
 
-        # Select random question from pool
-        question = random.choice(available_pool)
-        
-        # Update state with this being the "current" question
-        state.last_question_id = question.id
-        await self.db.commit()
-        await self.db.refresh(state)
-        
-        return QuestionResponse(
-            userId=user.id,
-            questionId=question.id,
-            difficulty=question.difficulty,
-            prompt=question.prompt,
-            choices=question.choices
+        The issued set is recorded once in Redis instead of per question, and
+        last_question_id is set to the first question, as /next would.
+        """
+        with timed("get_next_batch", "db"):
+            state = await self.get_or_create_user(user_id)
+        current_diff = int(state.current_difficulty)
+
+        answered = AnsweredService(self.db, read_db=self.read_db)
+        with timed("get_next_batch", "redis"):
+            questions = await answered.pick_unanswered(state.user_id, current_diff, count)
+            if not questions:
+                # Everything answered: allow repeats from the whole bank
+                bank = question_repo.get_all_questions()
+                questions = random.sample(bank, min(count, len(bank)))
+            # A short bucket is filled from the whole bank, so the batch can
+            # hold questions of the alternate levels: pick that many more there
+            batch_ids = {question.id for question in questions}
+
+            async def alternates(difficulty: int) -> List[Question]:
+                taken = sum(question.difficulty == difficulty for question in questions)
+                picked = await answered.pick_unanswered(state.user_id, difficulty, count + taken, fallback=False)
+                return [question for question in picked if question.id not in batch_ids][:count]
+
+            # The bitmap is complete after the first pick, so no rebuild races here
+            easier, harder = await asyncio.gather(alternates(current_diff - 1), alternates(current_diff + 1))
+            await answered.record_issued(state.user_id, [*questions, *easier, *harder])
+
+        with timed("get_next_batch", "db"):
+            await self.db.execute(
+                update(UserState.__table__)
+                .where(UserState.user_id == state.user_id)
+                .values(last_question_id=questions[0].id)
+            )
+            await self.db.commit()
+
+        with timed("get_next_batch", "serialization"):
+            def to_response(question: Question) -> QuestionResponse:
+                return QuestionResponse(
+                    userId=state.user_id,
+                    questionId=question.id,
+                    difficulty=question.difficulty,
+                    prompt=question.prompt,
+                    choices=list(question.choices)
+                )
+            return QuestionBatchResponse(
+                userId=state.user_id,
+                difficulty=current_diff,
+                questions=[to_response(q) for q in questions],
+                easier=[to_response(q) for q in easier],
+                harder=[to_response(q) for q in harder],
+            )
+
+    def apply_answer(self, state: UserState, question: Question, answer: str, now: datetime):
+        """Apply the scoring, streak and difficulty rules for one answer to ``state``.
+
+        Returns ``(is_correct, score_delta)``. Streak decay is not applied here.
+        The rules themselves live in ``scoring.score_answer``.
+        """
+        is_correct = (normalize_answer(answer) == question.normalized_answer)
+        transition = scoring.score_answer(
+            ScoreState(
+                difficulty=state.current_difficulty,
+                streak=state.current_streak,
+                max_streak=state.max_streak,
+                total_score=state.total_score,
+                daily_attempts=state.daily_attempts,
+                daily_correct=state.daily_correct,
+                last_activity=state.last_activity_date,
+            ),
+            question.difficulty,
+            is_correct,
+            now,
         )
+        new = transition.state
+        state.current_difficulty = new.difficulty
+        state.current_streak = new.streak
+        state.max_streak = new.max_streak
+        state.total_score = new.total_score
+        state.daily_attempts = new.daily_attempts
+        state.daily_correct = new.daily_correct
+        state.last_activity_date = new.last_activity
+        return is_correct, transition.score_delta
 
-    async def submit_answer(self, request: AnswerRequest) -> AnswerResponse:
-        # Check Idempotency using Redis
-        redis_client = get_redis_client()
-        key = f"idempotency:{request.idempotencyKey}"
-        # Set key if not exists, with 24h expiry
-        is_new = await redis_client.set(key, "1", ex=86400, nx=True)
-        
-        if not is_new:
-            # Key already exists, reject duplicate
-            raise HTTPException(status_code=409, detail="Request already processed (Idempotency Key)")
+    async def record_answer(self, state: UserState, question: Question, claim: IdempotencyClaim, guard: bool = False) -> int:
+        """Set the question's bit in the answered bitmap (and the
+        read-your-writes marker) ahead of the commit, in one atomic Redis call.
 
-        state = await self.get_user_state(request.userId)
+        Returns RECORDED, or KEY_USED (nothing written) if the key no longer
+        holds this request's in-flight marker. With ``guard`` the answered bitmap is checked first and
+        BITMAP_INCOMPLETE / ALREADY_ANSWERED can be returned as well. The
+        response and the rest follow the commit (complete_answers).
+        """
+        keys = [claim.slot.key, AnsweredService.key(state.user_id), recent_write_key(state.user_id)]
+        args = [
+            claim.marker,
+            claim.slot.field,
+            "1" if guard else "0",
+            question_repo.size,
+            question.index,
+            settings.ANSWERED_BITMAP_TTL_SECONDS,
+            self.read_your_writes_ms(),
+        ]
+        with timed("submit_answer", "redis"):
+            return await record_answer_script(keys=keys, args=args, client=self.redis)
+
+    async def complete_answers(
+        self,
+        now: datetime,
+        state: UserState,
+        answers: List[Tuple[Question, str, AnswerResponse]],
+        slots: List[IdempotencySlot],
+        marker: str,
+        best_streak: int,
+        deltas: List[int],
+        operation: str = "submit_answer"
+    ):
+        """Once the answers are committed, store each response in its
+        idempotency entry (``slots``, still holding ``marker``) and push the
+        post-answer state to the all-time and current daily/weekly
+        leaderboards (in sync mode), the state cache and the answer stream in
+        one atomic Redis call, then to the leaderboard shard if any.
+
+        The answers stand if this fails: retries are rejected until the
+        in-flight markers expire, and the boards are fixed by the user's next
+        answer (all-time) or a rebuild.
+        """
+        # Use current_streak to reflect immediate state (reset to 0 on wrong answer)
+        args = [
+            boards_flag(),
+            str(state.user_id),
+            state.total_score,
+            state.current_streak,
+            best_streak,
+            ",".join(str(delta) for delta in deltas),
+            settings.LEADERBOARD_DAILY_TTL_SECONDS,
+            settings.LEADERBOARD_WEEKLY_TTL_SECONDS,
+            settings.ANSWER_STREAM_MAXLEN,
+            slots[0].expire_at,
+            marker,
+            *(slot.field for slot in slots),
+            *(pack_response(response) for _, _, response in answers),
+            *(answer_event(state, question, answer, response, now) for question, answer, response in answers),
+            *UserStateCache.put_args(state),
+        ]
+        keys = [*answer_board_keys(now), UserStateCache.key(state.user_id), ANSWER_STREAM_KEY, *(slot.key for slot in slots)]
+        try:
+            with timed(operation, "redis"):
+                await complete_answers_script(keys=keys, args=args, client=self.redis)
+        except Exception as e:
+            logger.error("Could not complete recorded answers", user_id=str(state.user_id), error=str(e))
+            return
+        await self.record_on_shard(now, state, best_streak, deltas, operation)
+
+    async def record_on_shard(
+        self, now: datetime, state: UserState, best_streak: int, deltas: List[int], operation: str = "submit_answer"
+    ):
+        """With sharded leaderboards in sync mode, update the user's boards on
+        their shard once the answer is recorded, then notify CHANGES_CHANNEL. The answer
+        stands if this fails: the boards are fixed by the user's next answer
+        (all-time) or a rebuild."""
+        if settings.LEADERBOARD_UPDATE_MODE != "sync" or not leaderboard_shards.enabled:
+            return
+        try:
+            with timed(operation, "redis"):
+                await leaderboard_shards.record(
+                    answer_board_keys(now), state.user_id, state.total_score, state.current_streak, best_streak, deltas
+                )
+                await self.redis.publish(CHANGES_CHANNEL, str(state.user_id))
+        except Exception as e:
+            logger.error("Leaderboard shard write failed", user_id=str(state.user_id), error=str(e))
+
+    async def discard_recorded(self, user_id: str, questions: List[Question]):
+        """Undo what the record script wrote ahead of a commit that then
+        failed: the questions' bits in the answered bitmap."""
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for question in questions:
+                    pipe.setbit(AnsweredService.key(user_id), question.index, 0)
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Could not discard recorded answer", user_id=user_id, error=str(e))
+
+    def answer_response(self, state: UserState, is_correct: bool, score_delta: int) -> AnswerResponse:
+        with timed("submit_answer", "serialization"):
+            return AnswerResponse(
+                correct=is_correct,
+                newDifficulty=state.current_difficulty,
+                newStreak=state.current_streak,
+                scoreDelta=score_delta,
+                totalScore=state.total_score,
+                dailyStats={"attempts": state.daily_attempts, "correct": state.daily_correct}
+            )
+
+    def answer_body(self, response: AnswerResponse) -> str:
+        """Compact JSON of the response; replays render the stored copy the
+        same way, so retries get identical bytes."""
+        with timed("submit_answer", "serialization"):
+            return response.model_dump_json()
+
+    async def submit_answer(self, request: AnswerRequest) -> Response:
+        """Claim the idempotency key, then run one of the submit paths.
+
+        A retry of a finished request gets its stored response body back
+        without touching Postgres. The path stores its response under the key
+        once its answer is committed (complete_answers); if it fails the
+        in-flight marker is deleted so the client can retry.
+        """
+        idempotency = IdempotencyStore(self.redis)
+        with timed("submit_answer", "redis"):
+            claim = await idempotency.claim(request.userId, request.idempotencyKey, uuid4().hex)
+        if claim.stored is not None:
+            return Response(content=self.answer_body(unpack_response(claim.stored)), media_type="application/json")
+
+        try:
+            if settings.QUIZ_REQUIRE_ISSUED:
+                await self.check_issued(request.userId, request.questionId)
+            if settings.SUBMISSION_WRITE_BEHIND and submission_writer.running:
+                response = await self.submit_answer_write_behind(request, claim)
+            elif settings.SUBMIT_FAST_PATH:
+                response = await self.submit_answer_fast(request, claim)
+            else:
+                response = await self.submit_answer_orm(request, claim)
+        except BaseException:
+            await idempotency.release(claim)
+            raise
+        return Response(content=self.answer_body(response), media_type="application/json")
+
+    async def check_issued(self, user_id: str, question_id: str):
+        """400 unless the question is in the user's issued set (unknown ids
+        are left to the submit path)."""
+        question = question_repo.get_question_by_id(question_id)
+        if not question:
+            return
+        with timed("submit_answer", "redis"):
+            issued = await AnsweredService(self.db).issued_among(user_id, [question])
+        if not issued:
+            raise HTTPException(status_code=400, detail="Question not issued")
+
+    async def submit_answer_orm(self, request: AnswerRequest, claim: IdempotencyClaim) -> AnswerResponse:
+        with timed("submit_answer", "db"):
+            state = await self.get_user_state(request.userId)
         question = question_repo.get_question_by_id(request.questionId)
         
         if not question:
@@ -123,84 +536,19 @@ class QuizService:
         await self.check_streak_decay(state)
             
         # Check if already answered using composite index
-        result = await self.db.execute(
-            select(UserSubmission).where(
-                UserSubmission.user_id == request.userId, 
-                UserSubmission.question_id == request.questionId
+        with timed("submit_answer", "db"):
+            result = await self.db.execute(
+                select(UserSubmission).where(
+                    UserSubmission.user_id == request.userId, 
+                    UserSubmission.question_id == request.questionId
+                )
             )
-        )
         if result.scalars().first():
             raise HTTPException(status_code=400, detail="Question already answered")
         
         # Check if already answered - Logic moved to DB constraint handling below
         now = datetime.now(timezone.utc)
-        
-        # Handle timezone awareness for last_activity_date
-        last_active = state.last_activity_date
-        if last_active and last_active.tzinfo is None:
-            last_active = last_active.replace(tzinfo=timezone.utc)
-
-        if last_active and last_active.date() < now.date():
-             state.daily_attempts = 0
-             state.daily_correct = 0
-
-        # Update attempts
-        state.daily_attempts += 1
-        
-        # Verify Answer
-        is_correct = (request.answer.lower().strip() == question.correct_answer.lower().strip())
-        
-        score_delta = 0
-        if is_correct:
-            state.daily_correct += 1
-            # Calculate Score
-            daily_acc = state.daily_correct / state.daily_attempts
-            
-            # Streak Multiplier
-            streak_mult = min(1 + (state.current_streak * 0.1), 2.5)
-            
-            # Accuracy Multiplier Map
-            # Ranges: 0-0.2, 0.21-0.5, 0.51-0.75, 0.75-1
-            # Using concrete values for these ranges to normalize score impact
-            if daily_acc <= 0.2:
-                acc_mult = 0.5
-            elif daily_acc <= 0.5:
-                acc_mult = 0.75
-            elif daily_acc <= 0.75:
-                acc_mult = 0.9
-            else:
-                acc_mult = 1.0
-            
-            base_score = 10
-            score_delta = int(base_score * question.difficulty * streak_mult * acc_mult)
-            
-            state.total_score += score_delta
-            state.current_streak += 1
-            state.max_streak = max(state.max_streak, state.current_streak)
-            
-            # Increase difficulty
-            current_diff = float(state.current_difficulty) if state.current_difficulty > 0 else 1.0
-            increment = (1.0 / int(current_diff))
-            state.current_difficulty = min(current_diff + increment, 10.0)
-            
-        else:
-            # Wrong answer
-            # Penalty based on accuracy
-            daily_acc = state.daily_correct / state.daily_attempts if state.daily_attempts > 0 else 0.0
-            
-            penalty = int((1 - daily_acc) * 20)
-            
-            score_delta = -penalty
-            state.total_score = max(0, state.total_score - penalty)
-            
-            state.current_streak = 0
-            
-            # Decrease difficulty: current - (1 / floor(current))
-            current_diff = float(state.current_difficulty) if state.current_difficulty > 0 else 1.0
-            decrement = 1.0 / int(current_diff)
-            state.current_difficulty = max(current_diff - decrement, 1.0)
-
-        state.last_activity_date = now
+        is_correct, score_delta = self.apply_answer(state, question, request.answer, now)
         
         # Record submission
         new_submission = UserSubmission(
@@ -212,55 +560,456 @@ class QuizService:
         )
         self.db.add(new_submission)
 
+        recorded = False
         try:
             # Check constraints first without finalizing
-            await self.db.flush()
+            with timed("submit_answer", "db"):
+                await self.db.flush()
             
-            # Update Redis Leaderboards - Fail the request if Redis is down (Strict requirement)
-            redis_client = get_redis_client()
-            await redis_client.zadd("leaderboard:score", {str(request.userId): state.total_score})
-            # Use current_streak to reflect immediate state (reset to 0 on wrong answer)
-            await redis_client.zadd("leaderboard:streak", {str(request.userId): state.current_streak})
+            # Check the idempotency key and set the answered bit before committing;
+            # a Redis error here fails the request. The boards, cache and stored
+            # response follow the commit (complete_answers), where errors are only logged
+            response = self.answer_response(state, is_correct, score_delta)
+            if await self.record_answer(state, question, claim) == KEY_USED:
+                # Key already exists, reject duplicate
+                await self.db.rollback()
+                raise HTTPException(status_code=409, detail="Request already processed (Idempotency Key)")
+            recorded = True
 
-            # Commit DB changes if Redis succeeded
-            await self.db.commit()
-            await self.db.refresh(state)
+            # Commit DB changes (the flush already bumped the version)
+            with timed("submit_answer", "db"):
+                await self.db.commit()
 
+        except HTTPException:
+            raise
         except IntegrityError:
             await self.db.rollback()
             raise HTTPException(status_code=400, detail="Question already answered")
+        except StaleDataError:
+            # Another answer for this user committed since we read the state
+            await self.db.rollback()
+            raise HTTPException(status_code=409, detail="Concurrent update, retry")
         except Exception as e:
             await self.db.rollback()
             logger.error("Transaction failed", error=str(e))
+            if recorded:
+                await self.discard_recorded(request.userId, [question])
             raise HTTPException(status_code=500, detail="Internal Server Error")
 
-        return AnswerResponse(
-            correct=is_correct,
-            newDifficulty=state.current_difficulty,
-            newStreak=state.current_streak,
-            scoreDelta=score_delta,
-            totalScore=state.total_score,
-            dailyStats={"attempts": state.daily_attempts, "correct": state.daily_correct}
+        await self.complete_answers(now, state, [(question, request.answer, response)], [claim.slot], claim.marker, state.current_streak, [score_delta])
+        return response
+
+    async def submit_answer_fast(self, request: AnswerRequest, claim: IdempotencyClaim) -> AnswerResponse:
+        """Single-statement variant of the submit_answer database work.
+
+        The state row is read with FOR UPDATE (so scoring sees a stable row),
+        then one statement inserts the submission with ON CONFLICT DO NOTHING
+        on ``idx_user_question`` and updates ``user_state`` only if the insert
+        happened, returning the new state. No duplicate SELECT, no refresh.
+        """
+        with timed("submit_answer", "db"):
+            result = await self.db.execute(
+                select(UserState.__table__)
+                .where(UserState.user_id == request.userId)
+                .with_for_update()
+            )
+        row = result.first()
+        if not row:
+            raise HTTPException(status_code=404, detail="User state not found")
+
+        question = question_repo.get_question_by_id(request.questionId)
+        if not question:
+            await self.db.rollback()
+            raise HTTPException(status_code=400, detail="Invalid question ID")
+
+        # Transient copy: scoring mutates it without the session flushing it
+        state = UserState(**row._mapping)
+        await self.check_streak_decay(state)
+
+        now = datetime.now(timezone.utc)
+        is_correct, score_delta = self.apply_answer(state, question, request.answer, now)
+
+        submission = (
+            pg_insert(UserSubmission)
+            .values(
+                id=str(uuid4()),
+                user_id=state.user_id,
+                question_id=question.id,
+                submitted_answer=request.answer,
+                is_correct=is_correct,
+                created_at=now
+            )
+            .on_conflict_do_nothing(index_elements=[UserSubmission.user_id, UserSubmission.question_id])
+            .returning(UserSubmission.id)
+            .cte("new_submission")
+        )
+        user_state = UserState.__table__
+        stmt = (
+            update(user_state)
+            .where(user_state.c.user_id == state.user_id, exists(select(submission.c.id)))
+            .values(
+                current_difficulty=state.current_difficulty,
+                current_streak=state.current_streak,
+                max_streak=state.max_streak,
+                total_score=state.total_score,
+                daily_attempts=state.daily_attempts,
+                daily_correct=state.daily_correct,
+                last_activity_date=now,
+                version=user_state.c.version + 1
+            )
+            .returning(user_state)
+            .add_cte(submission)
         )
 
-    async def get_user_metrics(self, user_id: str) -> MetricsResponse:
-        state = await self.get_user_state(user_id)
+        recorded = False
+        try:
+            with timed("submit_answer", "db"):
+                updated = (await self.db.execute(stmt)).first()
+            if not updated:
+                # The unique index swallowed the insert: already answered
+                await self.db.rollback()
+                raise HTTPException(status_code=400, detail="Question already answered")
+
+            state = UserState(**updated._mapping)
+            response = self.answer_response(state, is_correct, score_delta)
+            if await self.record_answer(state, question, claim) == KEY_USED:
+                await self.db.rollback()
+                raise HTTPException(status_code=409, detail="Request already processed (Idempotency Key)")
+            recorded = True
+            with timed("submit_answer", "db"):
+                await self.db.commit()
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Transaction failed", error=str(e))
+            if recorded:
+                await self.discard_recorded(request.userId, [question])
+            raise HTTPException(status_code=500, detail="Internal Server Error")
+
+        await self.complete_answers(now, state, [(question, request.answer, response)], [claim.slot], claim.marker, state.current_streak, [score_delta])
+        return response
+
+    async def submit_answer_write_behind(self, request: AnswerRequest, claim: IdempotencyClaim) -> AnswerResponse:
+        """submit_answer variant that hands the submission row to the
+        per-worker SubmissionWriter instead of inserting it inline.
+
+        Rows can sit in any worker's queue for up to a flush interval, so the
+        unique index can't be the duplicate guard here. The answered bitmap
+        takes that role, checked and set atomically with the idempotency key
+        by record_answer(guard=True).
+        """
+        with timed("submit_answer", "db"):
+            state = await self.get_user_state(request.userId)
+        question = question_repo.get_question_by_id(request.questionId)
+        
+        if not question:
+            raise HTTPException(status_code=400, detail="Invalid question ID")
+
+        await self.check_streak_decay(state)
+
+        # Backpressure: wait for room in the write-behind queue before doing any work
+        await submission_writer.reserve()
+        recorded = False
+        try:
+            now = datetime.now(timezone.utc)
+            is_correct, score_delta = self.apply_answer(state, question, request.answer, now)
+            # Flush first so the new row version is what gets cached
+            with timed("submit_answer", "db"):
+                await self.db.flush()
+
+            response = self.answer_response(state, is_correct, score_delta)
+            status = await self.record_answer(state, question, claim, guard=True)
+            if status == BITMAP_INCOMPLETE:
+                await AnsweredService(self.db).rebuild(state.user_id)
+                status = await self.record_answer(state, question, claim, guard=True)
+
+            if status == KEY_USED:
+                await self.db.rollback()
+                raise HTTPException(status_code=409, detail="Request already processed (Idempotency Key)")
+            if status == ALREADY_ANSWERED:
+                await self.db.rollback()
+                raise HTTPException(status_code=400, detail="Question already answered")
+            recorded = True
+
+            with timed("submit_answer", "db"):
+                await self.db.commit()
+
+        except HTTPException:
+            submission_writer.release()
+            raise
+        except StaleDataError:
+            submission_writer.release()
+            await self.db.rollback()
+            raise HTTPException(status_code=409, detail="Concurrent update, retry")
+        except Exception as e:
+            submission_writer.release()
+            await self.db.rollback()
+            logger.error("Transaction failed", error=str(e))
+            if recorded:
+                await self.discard_recorded(request.userId, [question])
+            raise HTTPException(status_code=500, detail="Internal Server Error")
+
+        submission_writer.enqueue({
+            "id": str(uuid4()),
+            "user_id": state.user_id,
+            "question_id": question.id,
+            "submitted_answer": request.answer,
+            "is_correct": is_correct,
+            "created_at": now,
+        })
+
+        await self.complete_answers(now, state, [(question, request.answer, response)], [claim.slot], claim.marker, state.current_streak, [score_delta])
+        return response
+
+    async def submit_answers(self, request: BulkAnswerRequest) -> BulkAnswerResponse:
+        """Apply an ordered list of one user's answers (offline replay).
+
+        Each item gets the status and response a sequential /answer call would
+        have produced: the stored response for a used idempotency key, 400 for
+        invalid or already answered questions. The accepted ones cost one FOR UPDATE read, one MGET
+        of the idempotency keys, one SELECT of already answered questions, one
+        multi-row INSERT, one UPDATE of user_state and a Redis script call on
+        either side of the commit.
+
+        In write-behind mode the answered bitmap replaces the SELECT and is
+        re-checked by the script (as for single answers), and the rows go to
+        the SubmissionWriter instead of the INSERT.
+        """
+        if not request.answers:
+            return BulkAnswerResponse(userId=request.userId, results=[])
+        if len(request.answers) > settings.QUIZ_BULK_MAX_ANSWERS:
+            raise HTTPException(status_code=400, detail=f"At most {settings.QUIZ_BULK_MAX_ANSWERS} answers per request")
+
+        user_state = UserState.__table__
+        with timed("submit_answers", "db"):
+            row = (await self.db.execute(
+                select(user_state).where(user_state.c.user_id == request.userId).with_for_update()
+            )).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="User state not found")
+        state = UserState(**row._mapping)
+        # Decay only applies to the first answer: it refreshes updated_at
+        await self.check_streak_decay(state)
+
+        question_ids = {item.questionId for item in request.answers}
+        with timed("submit_answers", "redis"):
+            idempotency = IdempotencyStore(self.redis)
+            stored_values = await idempotency.get_many(state.user_id, [item.idempotencyKey for item in request.answers])
+            if settings.QUIZ_REQUIRE_ISSUED:
+                questions = filter(None, map(question_repo.get_question_by_id, question_ids))
+                issued_ids = await AnsweredService(self.db).issued_among(state.user_id, questions)
+        stored = {item.idempotencyKey: value for item, value in zip(request.answers, stored_values) if value is not None}
+        write_behind = settings.SUBMISSION_WRITE_BEHIND and submission_writer.running
+        if write_behind:
+            # Rows queued on any worker aren't in the table yet, but are in the bitmap
+            questions = filter(None, map(question_repo.get_question_by_id, question_ids))
+            with timed("submit_answers", "redis"):
+                answered = await AnsweredService(self.db).answered_among(state.user_id, questions)
+        else:
+            with timed("submit_answers", "db"):
+                result = await self.db.execute(
+                    select(UserSubmission.question_id).where(
+                        UserSubmission.user_id == state.user_id,
+                        UserSubmission.question_id.in_(question_ids)
+                    )
+                )
+            answered = set(result.scalars().all())
+
+        now = datetime.now(timezone.utc)
+        results: List[BulkAnswerResult] = []
+        # Responses of the items accepted in this batch, by idempotency key
+        issued: Dict[str, AnswerResponse] = {}
+        rows: List[dict] = []
+        accepted: List[Question] = []
+        deltas: List[int] = []
+        best_streak = 0
+        for item in request.answers:
+            value = stored.get(item.idempotencyKey)
+            question = question_repo.get_question_by_id(item.questionId)
+            if value is not None and is_inflight(value):
+                status, error = 409, "Request already in progress, retry"
+            elif value is not None or item.idempotencyKey in issued:
+                # Replay, as a single retry would get
+                response = issued.get(item.idempotencyKey) or unpack_response(value)
+                results.append(BulkAnswerResult(idempotencyKey=item.idempotencyKey, questionId=item.questionId, status=200, result=response))
+                continue
+            elif not question:
+                status, error = 400, "Invalid question ID"
+            elif settings.QUIZ_REQUIRE_ISSUED and question.id not in issued_ids:
+                status, error = 400, "Question not issued"
+            elif question.id in answered:
+                status, error = 400, "Question already answered"
+            else:
+                is_correct, score_delta = self.apply_answer(state, question, item.answer, now)
+                answered.add(question.id)
+                rows.append({
+                    "id": str(uuid4()),
+                    "user_id": state.user_id,
+                    "question_id": question.id,
+                    "submitted_answer": item.answer,
+                    "is_correct": is_correct,
+                    "created_at": now,
+                })
+                accepted.append(question)
+                deltas.append(score_delta)
+                best_streak = max(best_streak, state.current_streak)
+                issued[item.idempotencyKey] = self.answer_response(state, is_correct, score_delta)
+                results.append(BulkAnswerResult(
+                    idempotencyKey=item.idempotencyKey,
+                    questionId=item.questionId,
+                    status=200,
+                    result=issued[item.idempotencyKey]
+                ))
+                continue
+            results.append(BulkAnswerResult(idempotencyKey=item.idempotencyKey, questionId=item.questionId, status=status, error=error))
+
+        if not rows:
+            await self.db.rollback()
+            return BulkAnswerResponse(userId=state.user_id, results=results)
+
+        if write_behind:
+            await submission_writer.reserve(len(rows))
+        recorded = False
+        try:
+            with timed("submit_answers", "db"):
+                if not write_behind:
+                    await self.db.execute(pg_insert(UserSubmission), rows)
+                state.version = (await self.db.execute(
+                    update(user_state)
+                    .where(user_state.c.user_id == state.user_id)
+                    .values(
+                        current_difficulty=state.current_difficulty,
+                        current_streak=state.current_streak,
+                        max_streak=state.max_streak,
+                        total_score=state.total_score,
+                        daily_attempts=state.daily_attempts,
+                        daily_correct=state.daily_correct,
+                        last_activity_date=now,
+                        version=user_state.c.version + 1
+                    )
+                    .returning(user_state.c.version)
+                )).scalar_one()
+
+            slots = [idempotency.slot(state.user_id, key, now.timestamp()) for key in issued]
+            now_ms = int(now.timestamp() * 1000)
+            marker = idempotency.marker(uuid4().hex, now_ms)
+            keys = [AnsweredService.key(state.user_id), recent_write_key(state.user_id), *(slot.key for slot in slots)]
+            args = [
+                "1" if write_behind else "0",
+                question_repo.size,
+                ",".join(str(question.index) for question in accepted),
+                settings.ANSWERED_BITMAP_TTL_SECONDS,
+                self.read_your_writes_ms(),
+                marker,
+                settings.IDEMPOTENCY_INFLIGHT_MS,
+                now_ms,
+                *(slot.field for slot in slots),
+                slots[0].expire_at,
+            ]
+            with timed("submit_answers", "redis"):
+                status = await record_answers_script(keys=keys, args=args, client=self.redis)
+                if status == BITMAP_INCOMPLETE:
+                    await AnsweredService(self.db).rebuild(state.user_id)
+                    status = await record_answers_script(keys=keys, args=args, client=self.redis)
+            if status == KEY_USED:
+                # A concurrent request claimed one of the keys since the MGET
+                await self.db.rollback()
+                raise HTTPException(status_code=409, detail="Request already processed (Idempotency Key)")
+            if status == ALREADY_ANSWERED:
+                # Another worker recorded one of these questions since the bitmap read
+                await self.db.rollback()
+                raise HTTPException(status_code=409, detail="Concurrent update, retry")
+            recorded = True
+
+            with timed("submit_answers", "db"):
+                await self.db.commit()
+
+        except HTTPException:
+            if write_behind:
+                submission_writer.release(len(rows))
+            raise
+        except IntegrityError:
+            # A concurrent single answer inserted one of these questions
+            await self.db.rollback()
+            raise HTTPException(status_code=409, detail="Concurrent update, retry")
+        except Exception as e:
+            if write_behind:
+                submission_writer.release(len(rows))
+            await self.db.rollback()
+            logger.error("Transaction failed", error=str(e))
+            if recorded:
+                await self.discard_recorded(request.userId, accepted)
+                await idempotency.release_slots(slots, marker)
+            raise HTTPException(status_code=500, detail="Internal Server Error")
+
+        if write_behind:
+            for row in rows:
+                submission_writer.enqueue(row)
+
+        await self.complete_answers(
+            now, state, [(question, row["submitted_answer"], response) for question, row, response in zip(accepted, rows, issued.values())],
+            slots, marker, best_streak, deltas, "submit_answers"
+        )
+        return BulkAnswerResponse(userId=state.user_id, results=results)
+
+    async def get_user_metrics(self, user_id: str, rank_mode: Optional[str] = None) -> MetricsResponse:
+        """State plus both board ranks. In "percentile" mode ranks come from the
+        per-worker histogram (exact only for the top RANK_EXACT_TOP_K) along
+        with the user's top percent, instead of a ZREVRANK per board."""
+        rank_mode = rank_mode or settings.METRICS_RANK_MODE
+        if rank_mode not in RANK_MODES:
+            raise HTTPException(status_code=400, detail=f"rankMode must be one of {', '.join(RANK_MODES)}")
+        exact = rank_mode == "exact"
+
+        # State from the cache and, in exact mode, both ranks (0-based index, so
+        # +1 for human rank) in one round trip; Postgres is only hit on a cache miss
+        with timed("get_user_metrics", "redis"):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hgetall(UserStateCache.key(user_id))
+                pipe.exists(recent_write_key(user_id))
+                if exact and not leaderboard_shards.enabled:
+                    pipe.zrevrank("leaderboard:score", str(user_id))
+                    pipe.zrevrank("leaderboard:streak", str(user_id))
+                cached, recently_wrote, *positions = await pipe.execute()
+
+        state = UserStateCache.from_hash(user_id, cached)
+        if state is None:
+            with timed("get_user_metrics", "db"):
+                session = await pick_session(user_id, self.db, self.read_db, self.redis, bool(recently_wrote))
+                state = await self.get_user_state(user_id, session)
+            with timed("get_user_metrics", "redis"):
+                await UserStateCache(self.redis).put(state)
+
+        if exact:
+            if leaderboard_shards.enabled:
+                with timed("get_user_metrics", "redis"):
+                    positions = await leaderboard_shards.ranks([board_key("score"), board_key("streak")], str(user_id))
+            score_rank, streak_rank = (p + 1 if p is not None else None for p in positions)
+            score_top = streak_top = None
+        else:
+            # Scores as the all-time boards hold them: the streak board has
+            # current streaks (see update_boards), not max_streak
+            with timed("get_user_metrics", "redis"):
+                ranks = await rank_histogram.ranks(
+                    self.redis, str(user_id), {"score": state.total_score, "streak": state.current_streak}
+                )
+            (score_rank, score_top), (streak_rank, streak_top) = ranks["score"], ranks["streak"]
         
         daily_acc = 0.0
         if state.daily_attempts > 0:
             daily_acc = state.daily_correct / state.daily_attempts
-            
-        # Get ranks from Redis (0-based index, so +1 for human rank)
-        redis_client = get_redis_client()
-        score_rank = await redis_client.zrevrank("leaderboard:score", str(user_id))
-        streak_rank = await redis_client.zrevrank("leaderboard:streak", str(user_id))
         
-        return MetricsResponse(
-            currentDifficulty=state.current_difficulty,
-            streak=state.current_streak,
-            maxStreak=state.max_streak,
-            totalScore=state.total_score,
-            scoreRank=score_rank + 1 if score_rank is not None else None,
-            streakRank=streak_rank + 1 if streak_rank is not None else None,
-            dailyAccuracy=daily_acc
-        )
+        with timed("get_user_metrics", "serialization"):
+            return MetricsResponse(
+                currentDifficulty=state.current_difficulty,
+                streak=state.current_streak,
+                maxStreak=state.max_streak,
+                totalScore=state.total_score,
+                scoreRank=score_rank,
+                streakRank=streak_rank,
+                dailyAccuracy=daily_acc,
+                scoreTopPercent=score_top,
+                streakTopPercent=streak_top,
+            )
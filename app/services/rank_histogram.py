@@ -0,0 +1,170 @@
+import asyncio
+import time
+from bisect import bisect_right
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.core.metrics import Gauge, register
+from app.services.leaderboard_service import board_key
+from app.services.leaderboard_shards import leaderboard_shards
+
+logger = structlog.get_logger()
+
+# How get_user_metrics ranks a user: exact ZREVRANK positions, or "top X%"
+# from the histogram with exact ranks only near the top
+RANK_MODES = ("exact", "percentile")
+
+class Histogram(NamedTuple):
+    """Score distribution of one board at ``taken_at``: ``at_least[i]`` members
+    score >= ``bounds[i]``. The first bound is the lowest score and the last
+    is the highest score + 1 (count 0). ``top_cutoff`` is the score of the
+    K-th best member (RANK_EXACT_TOP_K), None if the board has fewer."""
+    bounds: List[int]
+    at_least: List[int]
+    taken_at: float
+    top_cutoff: Optional[float]
+
+    @property
+    def total(self) -> int:
+        return self.at_least[0]
+
+    def members_above(self, score: int) -> float:
+        """Estimated members scoring strictly above ``score`` (interpolated
+        within its bucket)."""
+        i = min(max(bisect_right(self.bounds, score) - 1, 0), len(self.bounds) - 2)
+        lower, upper = self.bounds[i], self.bounds[i + 1]
+        in_bucket = self.at_least[i] - self.at_least[i + 1]
+        fraction = max(min((upper - 1 - score) / (upper - lower), 1.0), 0.0)
+        return self.at_least[i + 1] + in_bucket * fraction
+
+    def in_top(self, score: int) -> bool:
+        """Whether ``score`` reached the top K when the snapshot was taken
+        (ties with the K-th member included)."""
+        return self.top_cutoff is None or score >= self.top_cutoff
+
+def bucket_bounds(min_score: int, max_score: int, buckets: int) -> List[int]:
+    """Integer lower bounds from ``min_score`` up to ``max_score``, then
+    ``max_score + 1``, log-spaced so buckets are narrow near the bottom
+    where most players are."""
+    span = max_score - min_score + 1
+    bounds = {min_score}
+    for i in range(1, buckets):
+        bounds.add(min_score + int(span ** (i / buckets)))
+    return sorted(b for b in bounds if b <= max_score) + [max_score + 1]
+
+class RankHistogram:
+    """Per-worker snapshots of the all-time boards' score histograms.
+
+    A snapshot costs one pipelined ZCOUNT per bucket plus a ZREVRANGE of the
+    top RANK_EXACT_TOP_K, and is refreshed in the background once older than
+    RANK_HISTOGRAM_REFRESH_MS, while readers keep using the previous one.
+    With a snapshot, "top X%" is a binary search over the buckets instead of
+    a ZREVRANK per board; exact ranks are only looked up for users scoring at
+    least the snapshot's K-th best score, so the top K never depends on how
+    wide the (log-spaced) top buckets are.
+    """
+
+    def __init__(self, buckets: int, refresh_ms: int, exact_top_k: int):
+        self.buckets = buckets
+        self.refresh_s = refresh_ms / 1000
+        self.exact_top_k = exact_top_k
+        self._snapshots: Dict[str, Histogram] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.refreshes = 0
+
+    async def take(self, redis_client, board: str) -> Histogram:
+        """Histogram of ``board``, summed over the leaderboard shards if any."""
+        key = board_key(board)
+        clients = leaderboard_shards.clients or [redis_client]
+
+        async def extremes(client):
+            """Lowest entry and the top K entries (best first) of one shard."""
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zrange(key, 0, 0, withscores=True)
+                pipe.zrevrange(key, 0, self.exact_top_k - 1, withscores=True)
+                return await pipe.execute()
+
+        async def counts(client, bounds: List[int]) -> List[int]:
+            async with client.pipeline(transaction=False) as pipe:
+                for bound in bounds:
+                    pipe.zcount(key, bound, "+inf")
+                return await pipe.execute()
+
+        shards = await asyncio.gather(*map(extremes, clients))
+        lowest = [bottom[0][1] for bottom, _ in shards if bottom]
+        # The global top K is among the shards' top Ks
+        top = sorted((score for _, shard_top in shards for _, score in shard_top), reverse=True)[:self.exact_top_k]
+        bounds = bucket_bounds(int(min(lowest)), int(top[0]), self.buckets) if lowest else [0, 1]
+        per_shard = await asyncio.gather(*(counts(client, bounds[:-1]) for client in clients))
+        self.refreshes += 1
+        cutoff = top[-1] if len(top) == self.exact_top_k else None
+        return Histogram(bounds, [sum(column) for column in zip(*per_shard)] + [0], time.monotonic(), cutoff)
+
+    async def _refresh(self, redis_client, board: str) -> Histogram:
+        try:
+            self._snapshots[board] = await self.take(redis_client, board)
+            return self._snapshots[board]
+        finally:
+            del self._refreshing[board]
+
+    async def snapshot(self, redis_client, board: str) -> Histogram:
+        """Current snapshot of ``board``. A stale one is returned as is while a
+        single background task per board replaces it; only the very first
+        call waits for Redis."""
+        current = self._snapshots.get(board)
+        if current and time.monotonic() - current.taken_at < self.refresh_s:
+            return current
+        task = self._refreshing.get(board)
+        if task is None:
+            task = asyncio.create_task(self._refresh(redis_client, board))
+            # Don't leave a failed background refresh unretrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._refreshing[board] = task
+        if current:
+            return current
+        return await asyncio.shield(task)
+
+    async def ranks(self, redis_client, user_id: str, scores: Dict[str, int]) -> Dict[str, Tuple[Optional[int], Optional[float]]]:
+        """(rank, top percent) per board for the user's ``scores``. Rank is
+        exact for scores within the snapshot's top RANK_EXACT_TOP_K and None
+        below it."""
+        results, exact = {}, []
+        for board, score in scores.items():
+            histogram = await self.snapshot(redis_client, board)
+            if not histogram.total:
+                results[board] = (None, None)
+                exact.append(board)
+                continue
+            above = histogram.members_above(score)
+            results[board] = (None, float(f"{100 * min(above + 1, histogram.total) / histogram.total:.3g}"))
+            if histogram.in_top(score):
+                exact.append(board)
+
+        if not exact:
+            return results
+        if leaderboard_shards.enabled:
+            positions = await leaderboard_shards.ranks([board_key(board) for board in exact], user_id)
+        else:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for board in exact:
+                    pipe.zrevrank(board_key(board), user_id)
+                positions = await pipe.execute()
+        for board, position in zip(exact, positions):
+            results[board] = (position + 1 if position is not None else None, results[board][1])
+        return results
+
+rank_histogram = RankHistogram(
+    buckets=settings.RANK_HISTOGRAM_BUCKETS,
+    refresh_ms=settings.RANK_HISTOGRAM_REFRESH_MS,
+    exact_top_k=settings.RANK_EXACT_TOP_K,
+)
+
+register(Gauge(
+    "brainbolt_rank_histogram_refreshes_total",
+    "Score histogram snapshots taken by this worker",
+    (),
+    lambda: {(): rank_histogram.refreshes},
+    kind="counter",
+))
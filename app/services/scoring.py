@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+# Tunables of the adaptive scoring rules
+BASE_SCORE = 10
+STREAK_STEP = 0.1
+MAX_STREAK_MULTIPLIER = 2.5
+MIN_DIFFICULTY = 1.0
+MAX_DIFFICULTY = 10.0
+MAX_PENALTY = 20
+STREAK_DECAY_HOURS = 24
+# (upper bound of daily accuracy, multiplier), checked in order
+ACCURACY_MULTIPLIERS = ((0.2, 0.5), (0.5, 0.75), (0.75, 0.9), (1.0, 1.0))
+
+class ScoreState(NamedTuple):
+    """The part of a user's state the scoring rules read and write."""
+    difficulty: float = MIN_DIFFICULTY
+    streak: int = 0
+    max_streak: int = 0
+    total_score: int = 0
+    daily_attempts: int = 0
+    daily_correct: int = 0
+    last_activity: Optional[datetime] = None
+
+class Transition(NamedTuple):
+    state: ScoreState
+    correct: bool
+    score_delta: int
+
+def streak_multiplier(streak: int) -> float:
+    return min(1 + (streak * STREAK_STEP), MAX_STREAK_MULTIPLIER)
+
+def accuracy_multiplier(daily_accuracy: float) -> float:
+    for upper, multiplier in ACCURACY_MULTIPLIERS:
+        if daily_accuracy <= upper:
+            return multiplier
+    return ACCURACY_MULTIPLIERS[-1][1]
+
+def next_difficulty(difficulty: float, correct: bool) -> float:
+    """Step by 1 / floor(difficulty): up after a correct answer, down after a
+    wrong one, within [MIN_DIFFICULTY, MAX_DIFFICULTY]."""
+    current = float(difficulty) if difficulty > 0 else MIN_DIFFICULTY
+    step = 1.0 / int(current)
+    if correct:
+        return min(current + step, MAX_DIFFICULTY)
+    return max(current - step, MIN_DIFFICULTY)
+
+def decayed_streak(streak: int, last_update: Optional[datetime], now: datetime) -> int:
+    """Halve the streak if more than STREAK_DECAY_HOURS passed since the last update."""
+    if not last_update:
+        return streak
+    if last_update.tzinfo is None:
+        last_update = last_update.replace(tzinfo=timezone.utc)
+    hours = (now - last_update).total_seconds() / 3600
+    return int(streak / 2) if hours >= STREAK_DECAY_HOURS else streak
+
+def score_answer(state: ScoreState, question_difficulty: int, correct: bool, now: datetime) -> Transition:
+    """Apply one answer to ``state``. Pure: returns the new state with the
+    score delta (negative for a penalty). Streak decay is not applied here."""
+    attempts, daily_correct = state.daily_attempts, state.daily_correct
+    last_active = state.last_activity
+    if last_active and last_active.tzinfo is None:
+        last_active = last_active.replace(tzinfo=timezone.utc)
+    if last_active and last_active.date() < now.date():
+        attempts, daily_correct = 0, 0
+
+    attempts += 1
+    if correct:
+        daily_correct += 1
+        score_delta = int(
+            BASE_SCORE * question_difficulty
+            * streak_multiplier(state.streak)
+            * accuracy_multiplier(daily_correct / attempts)
+        )
+        streak = state.streak + 1
+        new_state = state._replace(
+            total_score=state.total_score + score_delta,
+            streak=streak,
+            max_streak=max(state.max_streak, streak),
+        )
+    else:
+        penalty = int((1 - daily_correct / attempts) * MAX_PENALTY)
+        score_delta = -penalty
+        new_state = state._replace(total_score=max(0, state.total_score - penalty), streak=0)
+
+    new_state = new_state._replace(
+        difficulty=next_difficulty(state.difficulty, correct),
+        daily_attempts=attempts,
+        daily_correct=daily_correct,
+        last_activity=now,
+    )
+    return Transition(new_state, correct, score_delta)
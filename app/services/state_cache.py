@@ -0,0 +1,70 @@
+from typing import Dict, List, Optional
+
+from app.models.user import UserState
+from app.core.config import settings
+from app.core.redis import register_script
+
+# Fields of UserState served from the cache. last_question_id and the
+# timestamps stay in Postgres: only submit_answer reads them.
+CACHED_FIELDS = (
+    "current_difficulty",
+    "current_streak",
+    "max_streak",
+    "total_score",
+    "daily_attempts",
+    "daily_correct",
+)
+
+# Lua body shared with the answer-recording script: writes the hash at
+# KEYS[key_index] unless the cached version is already >= the incoming one.
+PUT_STATE_LUA_TEMPLATE = """
+local cached_version = redis.call('HGET', KEYS[{key_index}], 'version')
+if not cached_version or tonumber(cached_version) < tonumber(ARGV[{version_index}]) then
+    redis.call('HSET', KEYS[{key_index}], 'version', ARGV[{version_index}], unpack(ARGV, {version_index} + 2))
+    redis.call('EXPIRE', KEYS[{key_index}], ARGV[{version_index} + 1])
+end
+"""
+
+put_state_script = register_script(PUT_STATE_LUA_TEMPLATE.format(key_index=1, version_index=1))
+
+class UserStateCache:
+    """Write-through Redis hash cache of the hot UserState fields.
+
+    Populated on read-miss and updated from submit_answer. Every write carries
+    the row's ``version`` and is dropped if the cache already holds a newer
+    one, so a slow writer can't roll the cache back.
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        return f"user_state:{user_id}"
+
+    @staticmethod
+    def put_args(state: UserState) -> List:
+        """ARGV for PUT_STATE_LUA_TEMPLATE: version, ttl, then field/value pairs."""
+        args = [state.version, settings.STATE_CACHE_TTL_SECONDS]
+        for field in CACHED_FIELDS:
+            args.extend((field, getattr(state, field)))
+        return args
+
+    @staticmethod
+    def from_hash(user_id: str, data: Dict[str, str]) -> Optional[UserState]:
+        """Build a detached UserState from a cached hash, or None on a miss."""
+        if not data:
+            return None
+        return UserState(
+            user_id=user_id,
+            version=int(data["version"]),
+            current_difficulty=float(data["current_difficulty"]),
+            current_streak=int(data["current_streak"]),
+            max_streak=int(data["max_streak"]),
+            total_score=int(data["total_score"]),
+            daily_attempts=int(data["daily_attempts"]),
+            daily_correct=int(data["daily_correct"]),
+        )
+
+    async def put(self, state: UserState):
+        await put_state_script(keys=[self.key(state.user_id)], args=self.put_args(state), client=self.redis)
@@ -0,0 +1,145 @@
+import asyncio
+from typing import Dict, List, Optional, Set
+from fastapi import HTTPException
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import structlog
+
+from app.models.user import UserSubmission
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+
+logger = structlog.get_logger()
+
+class SubmissionWriter:
+    """Write-behind persistence of UserSubmission rows for one worker process.
+
+    Answers reserve a slot before doing any work (``reserve``), which is where
+    backpressure happens: when ``max_pending`` rows are waiting, callers wait up
+    to ``enqueue_timeout`` and then get a 503. Once the answer is committed the
+    row is queued (``enqueue``) and a background task writes batches with one
+    multi-row ``INSERT ... ON CONFLICT DO NOTHING`` per ``batch_size`` rows or
+    per ``flush_interval``, whichever comes first.
+
+    Rows stay visible through ``pending_question_ids`` until their batch is
+    committed, so rebuilding a user's answered bitmap doesn't miss them.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = settings.SUBMISSION_QUEUE_SIZE,
+        batch_size: int = settings.SUBMISSION_BATCH_SIZE,
+        flush_interval: float = settings.SUBMISSION_FLUSH_INTERVAL_MS / 1000,
+        enqueue_timeout: float = settings.SUBMISSION_ENQUEUE_TIMEOUT_MS / 1000,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._slots = asyncio.Semaphore(max_pending)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Dict[str, Set[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+            logger.info("Submission writer started", batch_size=self.batch_size, flush_interval=self.flush_interval)
+
+    async def stop(self, timeout: float = settings.SUBMISSION_DRAIN_TIMEOUT_S):
+        """Flush everything still queued, then stop the background task."""
+        if self._task is None:
+            return
+        self._stopping = True
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error("Submission writer drain timed out", unflushed=self._queue.qsize())
+        finally:
+            self._task = None
+        logger.info("Submission writer stopped")
+
+    async def reserve(self, count: int = 1):
+        taken = 0
+        try:
+            for _ in range(count):
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.enqueue_timeout)
+                taken += 1
+        except asyncio.TimeoutError:
+            self.release(taken)
+            logger.warning("Submission queue full, rejecting answer")
+            raise HTTPException(status_code=503, detail="Submission queue is full, retry later")
+
+    def release(self, count: int = 1):
+        """Give back slots from ``reserve`` when the answers were not accepted."""
+        for _ in range(count):
+            self._slots.release()
+
+    def enqueue(self, row: dict):
+        """Queue a row for a slot previously taken with ``reserve``."""
+        self._pending.setdefault(row["user_id"], set()).add(row["question_id"])
+        self._queue.put_nowait(row)
+
+    def pending_question_ids(self, user_id: str) -> Set[str]:
+        return set(self._pending.get(user_id, ()))
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+            elif self._stopping:
+                return
+
+    async def _next_batch(self) -> List[dict]:
+        batch: List[dict] = []
+        try:
+            batch.append(await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval))
+        except asyncio.TimeoutError:
+            return batch
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._stopping:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: List[dict]):
+        backoff = 0.1
+        while True:
+            try:
+                async with AsyncSessionLocal() as session:
+                    stmt = pg_insert(UserSubmission).values(batch).on_conflict_do_nothing(
+                        index_elements=[UserSubmission.user_id, UserSubmission.question_id]
+                    )
+                    await session.execute(stmt)
+                    await session.commit()
+                break
+            except Exception as e:
+                # Keep the batch and retry; new answers back up behind it
+                logger.error("Submission flush failed", error=str(e), rows=len(batch), retry_in=backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+
+        for row in batch:
+            question_ids = self._pending.get(row["user_id"])
+            if question_ids is not None:
+                question_ids.discard(row["question_id"])
+                if not question_ids:
+                    del self._pending[row["user_id"]]
+            self._slots.release()
+
+submission_writer = SubmissionWriter()
@@ -0,0 +1,103 @@
+import argparse
+import json
+import time
+import uuid
+
+import redis
+
+from app.schemas.quiz import AnswerResponse
+from app.services.idempotency import IdempotencyStore, pack_response
+
+DEFAULT_SIZES = [1_000_000, 10_000_000]
+PIPELINE_SIZE = 10_000
+
+SAMPLE_RESPONSE = AnswerResponse(
+    correct=True,
+    newDifficulty=3.5,
+    newStreak=4,
+    scoreDelta=36,
+    totalScore=1250,
+    dailyStats={"attempts": 12, "correct": 9},
+)
+
+# layout name -> (IdempotencyStore layout, stored value)
+LAYOUTS = {
+    # Standalone keys holding the JSON body (before the packed encoding)
+    "keys-json": ("keys", SAMPLE_RESPONSE.model_dump_json()),
+    "keys": ("keys", pack_response(SAMPLE_RESPONSE)),
+    "hashes": ("hashes", pack_response(SAMPLE_RESPONSE)),
+}
+
+def used_memory(client) -> int:
+    return client.info("memory")["used_memory"]
+
+def fill(client, layout: str, value: str, size: int, answers_per_user: int):
+    store = IdempotencyStore(client, layout)
+    now = time.time()
+    pipe = client.pipeline(transaction=False)
+    user_id = None
+    for i in range(size):
+        if i % answers_per_user == 0:
+            user_id = str(uuid.uuid4())
+        # Written the way the answer-recording scripts write a response
+        slot = store.slot(user_id, str(uuid.uuid4()), now)
+        if slot.field:
+            pipe.hset(slot.key, slot.field, value)
+        else:
+            pipe.set(slot.key, value)
+        pipe.expireat(slot.key, slot.expire_at)
+        if (i + 1) % PIPELINE_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+
+def measure(client, name: str, size: int, answers_per_user: int) -> dict:
+    layout, value = LAYOUTS[name]
+    client.flushdb()
+    before = used_memory(client)
+    started = time.perf_counter()
+    fill(client, layout, value, size, answers_per_user)
+    seconds = time.perf_counter() - started
+    used = used_memory(client) - before
+    sample = client.randomkey()
+    result = {
+        "layout": name,
+        "entries": size,
+        "redis_keys": client.dbsize(),
+        "used_bytes": used,
+        "bytes_per_entry": round(used / size, 1),
+        "encoding": client.object("encoding", sample) if sample else None,
+        "fill_seconds": round(seconds, 1),
+    }
+    client.flushdb()
+    return result
+
+def run():
+    parser = argparse.ArgumentParser(description="Compare Redis memory per idempotency entry across layouts")
+    parser.add_argument("--url", default="redis://localhost:6379/15", help="a scratch database: it is FLUSHed")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--answers-per-user", type=int, default=20, help="entries per user (per hash bucket)")
+    parser.add_argument("--layouts", nargs="+", choices=list(LAYOUTS), default=list(LAYOUTS))
+    parser.add_argument("--yes", action="store_true", help="don't refuse to flush a non-empty database")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(args.url, decode_responses=True)
+    if client.dbsize() and not args.yes:
+        parser.error(f"{args.url} is not empty; pass --yes to flush it")
+
+    if not args.json:
+        print(f"{'layout':>10} | {'entries':>10} | {'redis keys':>10} | {'used MB':>9} | {'B/entry':>8} | {'encoding':>9}")
+        print("-" * 72)
+    for size in args.sizes:
+        for name in args.layouts:
+            result = measure(client, name, size, args.answers_per_user)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(
+                    f"{name:>10} | {size:>10} | {result['redis_keys']:>10} | {result['used_bytes'] / 2**20:>9.1f} | "
+                    f"{result['bytes_per_entry']:>8} | {result['encoding']:>9}"
+                )
+
+if __name__ == "__main__":
+    run()
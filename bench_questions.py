@@ -0,0 +1,47 @@
+import random
+import timeit
+
+from app.data.questions import Question, QuestionRepository
+
+BANK_SIZES = [100, 1_000, 10_000, 50_000]
+LOOKUPS = 2_000
+
+
+def build_bank(size):
+    return [
+        Question(f"q{i}", f"Prompt {i}?", (i % 10) + 1, ["A", "B", "C", "D"], "A")
+        for i in range(size)
+    ]
+
+def linear_lookup(bank, question_id):
+    # Previous QuestionRepository.get_question_by_id behaviour
+    for q in bank:
+        if q.id == question_id:
+            return q
+    return None
+
+def linear_bucket(bank, difficulty):
+    # Previous QuestionRepository.get_questions_by_difficulty behaviour
+    return [q for q in bank if q.difficulty == difficulty]
+
+def per_call_us(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e6
+
+def run():
+    print(f"{'bank':>8} | {'scan lookup':>12} | {'index lookup':>12} | {'scan bucket':>12} | {'index bucket':>12}")
+    print("-" * 70)
+    for size in BANK_SIZES:
+        bank = build_bank(size)
+        repo = QuestionRepository(bank)
+        ids = [f"q{random.randrange(size)}" for _ in range(LOOKUPS)]
+        bucket_number = 20 if size >= 10_000 else 200
+
+        scan_lookup = per_call_us(lambda: [linear_lookup(bank, i) for i in ids], 1) / LOOKUPS
+        index_lookup = per_call_us(lambda: [repo.get_question_by_id(i) for i in ids], 1) / LOOKUPS
+        scan_bucket = per_call_us(lambda: linear_bucket(bank, 5), bucket_number)
+        index_bucket = per_call_us(lambda: repo.get_questions_by_difficulty(5), 10_000)
+
+        print(f"{size:>8} | {scan_lookup:>10.2f}us | {index_lookup:>10.3f}us | {scan_bucket:>10.2f}us | {index_bucket:>10.3f}us")
+
+if __name__ == "__main__":
+    run()
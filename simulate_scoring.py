@@ -0,0 +1,243 @@
+"""Offline, NumPy-vectorized replay of the scoring rules in app/services/scoring.py.
+
+Every step applies one answer to every (active) user at once, so millions of
+answer events run per second without the API, Postgres or Redis. Use it to
+see how a change to the scoring constants moves the score, streak and
+difficulty distributions before load-testing it.
+
+Events are either synthetic (each user answers at their current difficulty
+and is correct with probability sigmoid(skill - difficulty)) or recorded
+JSONL lines, replayed in file order per user:
+
+    {"userId": "u1", "questionId": "q7", "correct": true, "day": 0}
+
+``difficulty`` may be given instead of ``questionId``, ``answer`` instead
+of ``correct`` (checked against the question bank), and ``day`` (an int or
+an ISO date) is optional; a new day resets the daily accuracy counters.
+
+NumPy is only needed for this script and is not in requirements.txt.
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from app.data.questions import normalize_answer, question_repo
+from app.services import scoring
+
+PERCENTILES = (50, 90, 99)
+
+def new_state(users: int) -> dict:
+    return {
+        "difficulty": np.full(users, scoring.MIN_DIFFICULTY),
+        "streak": np.zeros(users, dtype=np.int64),
+        "max_streak": np.zeros(users, dtype=np.int64),
+        "total_score": np.zeros(users, dtype=np.int64),
+        "daily_attempts": np.zeros(users, dtype=np.int64),
+        "daily_correct": np.zeros(users, dtype=np.int64),
+    }
+
+def accuracy_multiplier(accuracy):
+    bounds = scoring.ACCURACY_MULTIPLIERS
+    return np.select(
+        [accuracy <= upper for upper, _ in bounds[:-1]],
+        [multiplier for _, multiplier in bounds[:-1]],
+        bounds[-1][1],
+    )
+
+def step(state: dict, question_difficulty, correct, new_day, active=None):
+    """Vectorized scoring.score_answer for one answer per user, in place.
+
+    ``new_day`` marks users whose answer falls on a later day than their
+    previous one; ``active`` masks out users without an answer this step.
+    Returns the score deltas.
+    """
+    attempts = np.where(new_day, 0, state["daily_attempts"]) + 1
+    daily_correct = np.where(new_day, 0, state["daily_correct"]) + correct
+    accuracy = daily_correct / attempts
+
+    # Same operation order as score_answer, so the float results are identical
+    gain = np.trunc(
+        scoring.BASE_SCORE * question_difficulty
+        * np.minimum(1 + state["streak"] * scoring.STREAK_STEP, scoring.MAX_STREAK_MULTIPLIER)
+        * accuracy_multiplier(accuracy)
+    ).astype(np.int64)
+    penalty = np.trunc((1 - accuracy) * scoring.MAX_PENALTY).astype(np.int64)
+
+    current = np.where(state["difficulty"] > 0, state["difficulty"], scoring.MIN_DIFFICULTY)
+    difficulty_step = 1.0 / np.floor(current)
+    streak = np.where(correct, state["streak"] + 1, 0)
+    updates = {
+        "total_score": np.where(correct, state["total_score"] + gain, np.maximum(0, state["total_score"] - penalty)),
+        "streak": streak,
+        "max_streak": np.maximum(state["max_streak"], streak),
+        "difficulty": np.where(
+            correct,
+            np.minimum(current + difficulty_step, scoring.MAX_DIFFICULTY),
+            np.maximum(current - difficulty_step, scoring.MIN_DIFFICULTY),
+        ),
+        "daily_attempts": attempts,
+        "daily_correct": daily_correct,
+    }
+    delta = np.where(correct, gain, -penalty)
+    if active is not None:
+        delta = np.where(active, delta, 0)
+    for field, value in updates.items():
+        state[field] = value if active is None else np.where(active, value, state[field])
+    return delta
+
+def synthetic(users: int, steps: int, skill_mean: float, skill_std: float, answers_per_day: int, seed: int, trace_users: int):
+    """Simulate ``steps`` answers for each of ``users`` synthetic users."""
+    rng = np.random.default_rng(seed)
+    skill = rng.normal(skill_mean, skill_std, users)
+    state = new_state(users)
+    trace = []
+    no_new_day = np.zeros(users, dtype=bool)
+    for i in range(steps):
+        question_difficulty = np.floor(state["difficulty"]).astype(np.int64)
+        correct = rng.random(users) < 1 / (1 + np.exp(question_difficulty - skill))
+        is_new_day = answers_per_day > 0 and i > 0 and i % answers_per_day == 0
+        new_day = ~no_new_day if is_new_day else no_new_day
+        if trace_users:
+            trace.append((question_difficulty[:trace_users].copy(), correct[:trace_users].copy(), new_day[:trace_users].copy()))
+        step(state, question_difficulty, correct, new_day)
+    return state, users * steps, trace
+
+def day_number(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+def load_events(path: str):
+    """Group recorded events per user, in file order, as padded
+    (steps x users) arrays plus an ``active`` mask."""
+    per_user = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            question = question_repo.get_question_by_id(event["questionId"]) if "questionId" in event else None
+            difficulty = question.difficulty if question else int(event["difficulty"])
+            if "correct" in event:
+                correct = bool(event["correct"])
+            else:
+                correct = question is not None and normalize_answer(event["answer"]) == question.normalized_answer
+            per_user[event["userId"]].append((difficulty, correct, day_number(event.get("day"))))
+
+    users = len(per_user)
+    steps = max((len(events) for events in per_user.values()), default=0)
+    question_difficulty = np.zeros((steps, users), dtype=np.int64)
+    correct = np.zeros((steps, users), dtype=bool)
+    day = np.zeros((steps, users), dtype=np.int64)
+    active = np.zeros((steps, users), dtype=bool)
+    for column, events in enumerate(per_user.values()):
+        rows = len(events)
+        question_difficulty[:rows, column] = [e[0] for e in events]
+        correct[:rows, column] = [e[1] for e in events]
+        day[:rows, column] = [e[2] for e in events]
+        active[:rows, column] = True
+    return question_difficulty, correct, day, active
+
+def recorded(path: str, trace_users: int):
+    question_difficulty, correct, day, active = load_events(path)
+    steps, users = question_difficulty.shape
+    state = new_state(users)
+    last_day = np.full(users, np.iinfo(np.int64).min)
+    trace = []
+    for i in range(steps):
+        new_day = active[i] & (last_day != np.iinfo(np.int64).min) & (day[i] > last_day)
+        if trace_users:
+            mask = active[i][:trace_users]
+            trace.append((question_difficulty[i][:trace_users], correct[i][:trace_users], new_day[:trace_users], mask))
+        step(state, question_difficulty[i], correct[i], new_day, active[i])
+        last_day = np.where(active[i], day[i], last_day)
+    return state, int(active.sum()), trace
+
+def check(state: dict, trace, users: int) -> int:
+    """Replay the traced users through the scalar scoring.score_answer and
+    count users whose final state differs from the vectorized one."""
+    start = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    mismatches = 0
+    for user in range(users):
+        s = scoring.ScoreState()
+        day = 0
+        for entry in trace:
+            if len(entry) == 4 and not entry[3][user]:
+                continue
+            question_difficulty, correct, new_day = entry[0][user], entry[1][user], entry[2][user]
+            day += 1 if new_day else 0
+            s = scoring.score_answer(s, int(question_difficulty), bool(correct), start + timedelta(days=day)).state
+        vectorized = (
+            state["difficulty"][user], state["streak"][user], state["max_streak"][user],
+            state["total_score"][user], state["daily_attempts"][user], state["daily_correct"][user],
+        )
+        if (s.difficulty, s.streak, s.max_streak, s.total_score, s.daily_attempts, s.daily_correct) != vectorized:
+            mismatches += 1
+    return mismatches
+
+def summarize(state: dict, events: int, seconds: float) -> dict:
+    difficulty_levels = np.floor(state["difficulty"]).astype(np.int64)
+    levels, counts = np.unique(difficulty_levels, return_counts=True)
+    return {
+        "users": int(state["total_score"].size),
+        "events": events,
+        "seconds": round(seconds, 3),
+        "events_per_sec": int(events / seconds) if seconds > 0 else None,
+        "total_score": {
+            "mean": round(float(state["total_score"].mean()), 1),
+            **{f"p{p}": int(np.percentile(state["total_score"], p)) for p in PERCENTILES},
+            "max": int(state["total_score"].max()),
+        },
+        "max_streak": {f"p{p}": int(np.percentile(state["max_streak"], p)) for p in PERCENTILES},
+        "difficulty": {int(level): int(count) for level, count in zip(levels, counts)},
+    }
+
+def run():
+    parser = argparse.ArgumentParser(description="Vectorized offline replay of the scoring rules")
+    parser.add_argument("--events", help="JSONL file of recorded answer events (default: synthetic)")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--steps", type=int, default=50, help="answers per synthetic user")
+    parser.add_argument("--skill-mean", type=float, default=5.0)
+    parser.add_argument("--skill-std", type=float, default=2.0)
+    parser.add_argument("--answers-per-day", type=int, default=0, help="synthetic day length (0 = one day)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", type=int, default=0, metavar="N", help="verify the first N users against scoring.score_answer")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("simulate_scoring.py needs NumPy: pip install numpy")
+
+    started = time.perf_counter()
+    if args.events:
+        state, events, trace = recorded(args.events, args.check)
+    else:
+        state, events, trace = synthetic(
+            args.users, args.steps, args.skill_mean, args.skill_std, args.answers_per_day, args.seed, args.check
+        )
+    summary = summarize(state, events, time.perf_counter() - started)
+    if args.check:
+        summary["check"] = {"users": min(args.check, summary["users"]), "mismatches": check(state, trace, min(args.check, summary["users"]))}
+
+    if args.json:
+        print(json.dumps(summary))
+        return
+    print(f"{summary['events']} events for {summary['users']} users in {summary['seconds']}s ({summary['events_per_sec']} events/s)")
+    print("total score:", summary["total_score"])
+    print("max streak: ", summary["max_streak"])
+    print("difficulty: ", summary["difficulty"])
+    if args.check:
+        print("check:      ", summary["check"])
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,104 @@
+"""Checks that POST /v1/quiz/answers gives every item the result a sequential
+POST /v1/quiz/answer call would have produced.
+
+Two fresh users answer the same ordered list: one item by item through
+/answer, the other in one /answers call. The list mixes correct and wrong
+answers across difficulties, a question answered twice, an unknown question
+and a retried idempotency key. Per-item statuses, responses and errors, and
+the users' final metrics, must match.
+"""
+import argparse
+import uuid
+
+import requests
+
+from app.data.questions import question_repo
+
+def new_user(base_url: str) -> str:
+    user_id = str(uuid.uuid4())
+    resp = requests.get(f"{base_url}/quiz/next", params={"userId": user_id})
+    resp.raise_for_status()
+    return user_id
+
+def build_answers(count: int):
+    """(questionId, answer, key label) items; equal labels share an idempotency key."""
+    questions = [
+        question_repo.get_questions_by_difficulty(difficulty)[0]
+        for difficulty in range(1, 11)
+        if question_repo.get_questions_by_difficulty(difficulty)
+    ][:count]
+    items = []
+    for i, question in enumerate(questions):
+        answer = question.correct_answer if i % 3 != 2 else "wrong"
+        items.append((question.id, answer, f"k{i}"))
+    items.insert(4, (questions[0].id, questions[0].correct_answer, "again"))  # already answered
+    items.insert(7, ("no-such-question", "x", "unknown"))  # invalid question
+    items.insert(9, items[2])  # retried idempotency key
+    return items
+
+def sequential(base_url: str, user_id: str, items, keys):
+    results = []
+    for question_id, answer, label in items:
+        resp = requests.post(f"{base_url}/quiz/answer", json={
+            "userId": user_id, "questionId": question_id, "answer": answer, "idempotencyKey": keys[label],
+        })
+        body = resp.json()
+        results.append((resp.status_code, body if resp.status_code == 200 else body["detail"]))
+    return results
+
+def bulk(base_url: str, user_id: str, items, keys):
+    resp = requests.post(f"{base_url}/quiz/answers", json={
+        "userId": user_id,
+        "answers": [
+            {"questionId": question_id, "answer": answer, "idempotencyKey": keys[label]}
+            for question_id, answer, label in items
+        ],
+    })
+    resp.raise_for_status()
+    return [
+        (result["status"], result["result"] if result["status"] == 200 else result["error"])
+        for result in resp.json()["results"]
+    ]
+
+def metrics(base_url: str, user_id: str) -> dict:
+    resp = requests.get(f"{base_url}/quiz/metrics/{user_id}")
+    resp.raise_for_status()
+    data = resp.json()
+    # Both users are on the boards; only their own state must match
+    for field in ("scoreRank", "streakRank", "scoreTopPercent", "streakTopPercent"):
+        data.pop(field, None)
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare bulk answer replay with sequential /answer calls")
+    parser.add_argument("--base-url", default="http://localhost:8000/v1")
+    parser.add_argument("--questions", type=int, default=10, help="distinct questions in the list (max 10)")
+    args = parser.parse_args()
+
+    items = build_answers(args.questions)
+    one_by_one, batched = new_user(args.base_url), new_user(args.base_url)
+    print(f"Sequential user {one_by_one}, bulk user {batched}, {len(items)} items")
+
+    expected = sequential(args.base_url, one_by_one, items, {label: str(uuid.uuid4()) for _, _, label in items})
+    got = bulk(args.base_url, batched, items, {label: str(uuid.uuid4()) for _, _, label in items})
+
+    failures = 0
+    for i, ((question_id, answer, label), want, have) in enumerate(zip(items, expected, got)):
+        ok = want == have
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {i:2d} {question_id:>16} {label:>8} sequential={want[0]} bulk={have[0]}")
+        if not ok:
+            print(f"     sequential: {want[1]}\n     bulk:       {have[1]}")
+
+    final_sequential, final_bulk = metrics(args.base_url, one_by_one), metrics(args.base_url, batched)
+    if final_sequential != final_bulk:
+        failures += 1
+        print(f"❌ final metrics differ\n     sequential: {final_sequential}\n     bulk:       {final_bulk}")
+
+    if failures:
+        print(f"❌ FAILED: {failures} mismatches")
+        exit(1)
+    print(f"✅ SUCCESS: {len(items)} bulk results and the final state match sequential calls.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Checks that request latency is labelled with the matched route's
+template, including when a path param value equals a static segment of the
+path (e.g. ``/v1/quiz/metrics/metrics``).
+
+Runs in-process against the app's own routers (no server needed); the
+endpoints fail without Postgres/Redis, which doesn't change the label.
+"""
+import re
+from collections import Counter
+
+from fastapi import FastAPI, APIRouter
+from fastapi.testclient import TestClient
+
+from app.core.metrics import MetricsMiddleware, REQUEST_LATENCY, include_router
+from app.api.v1.endpoints import quiz, leaderboard
+
+# Routes whose param values repeat other segments of the same path
+extra = APIRouter()
+
+@extra.get("/x/{a}/{b}")
+async def pair(a: str, b: str):
+    return {"a": a, "b": b}
+
+CASES = [
+    ("/v1/quiz/metrics/metrics", "/v1/quiz/metrics/{user_id}"),
+    ("/v1/quiz/metrics/quiz", "/v1/quiz/metrics/{user_id}"),
+    ("/v1/quiz/metrics/v1", "/v1/quiz/metrics/{user_id}"),
+    ("/x/1/1", "/x/{a}/{b}"),
+    ("/x/x/a", "/x/{a}/{b}"),
+    ("/no/such/route", "unmatched"),
+]
+
+COUNT_LINE = re.compile(r'_count\{method="[^"]*",route="([^"]*)",status="[^"]*"\} (\d+)')
+
+def requests_per_route() -> Counter:
+    counts = Counter()
+    for line in REQUEST_LATENCY.render():
+        match = COUNT_LINE.search(line)
+        if match:
+            counts[match.group(1)] += int(match.group(2))
+    return counts
+
+def main():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    include_router(app, quiz.router, prefix="/v1/quiz")
+    include_router(app, leaderboard.router, prefix="/v1/leaderboard")
+    include_router(app, extra, prefix="")
+    client = TestClient(app, raise_server_exceptions=False)
+
+    failures = 0
+    for path, expected in CASES:
+        before = requests_per_route()
+        client.get(path)
+        labelled = sorted((requests_per_route() - before).elements())
+        ok = labelled == [expected]
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {path:>28} -> {', '.join(labelled)}")
+
+    if failures:
+        print(f"❌ FAILED: {failures} mislabelled requests")
+        exit(1)
+    print(f"✅ SUCCESS: {len(CASES)} requests labelled with their route template.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Check sharded leaderboard reads against a single Redis holding the same data.
+
+Start a few scratch redis-server processes (they are FLUSHed), e.g.
+
+    for port in 6391 6392 6393 6394; do redis-server --port $port --save "" --daemonize yes; done
+    python verify_sharded_leaderboard.py --shards redis://localhost:6391 redis://localhost:6392 \\
+        redis://localhost:6393 --reference redis://localhost:6394
+
+Random answers (with plenty of tied scores) are written through the
+leaderboard update script to the reference and, via LeaderboardShards, to the
+owning shard only. Pages, ranks and around-me windows must then match the
+single-instance ZREVRANGE / ZREVRANK / around results exactly.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timezone
+
+def run():
+    parser = argparse.ArgumentParser(description="Compare sharded leaderboard reads with a single Redis")
+    parser.add_argument("--shards", nargs="+", required=True, help="scratch Redis URLs used as shards")
+    parser.add_argument("--reference", required=True, help="scratch Redis URL holding every member")
+    parser.add_argument("--members", type=int, default=20_000)
+    parser.add_argument("--samples", type=int, default=300)
+    args = parser.parse_args()
+
+    # Shard pools are created from settings at import time
+    os.environ["LEADERBOARD_REDIS_URLS"] = json.dumps(args.shards)
+    asyncio.run(verify(args))
+
+async def verify(args):
+    import redis.asyncio as redis
+    from app.services.leaderboard_service import AROUND_LUA, answer_board_keys
+    from app.services.leaderboard_shards import UPDATE_BOARDS_LUA, leaderboard_shards
+
+    reference = redis.Redis.from_url(args.reference, decode_responses=True)
+    for client in [reference, *leaderboard_shards.clients]:
+        await client.flushdb()
+    update_boards = reference.register_script(UPDATE_BOARDS_LUA)
+    around = reference.register_script(AROUND_LUA)
+
+    keys = answer_board_keys(datetime.now(timezone.utc))
+    members = [str(uuid.uuid4()) for _ in range(args.members)]
+    for member in members:
+        # Few distinct values, so most members share their score with others
+        score, streak = random.randint(0, 200) * 5, random.randint(0, 20)
+        deltas = [random.randint(-20, 60) for _ in range(random.randint(1, 3))]
+        await update_boards(keys=keys, args=[member, score, streak, streak, ",".join(map(str, deltas)), 3600, 3600])
+        await leaderboard_shards.record(keys, member, score, streak, streak, deltas)
+
+    sizes = [sum([await client.zcard(key) for client in leaderboard_shards.clients]) for key in keys]
+    assert sizes == [await reference.zcard(key) for key in keys], "member counts differ"
+    per_shard = [await client.zcard(keys[0]) for client in leaderboard_shards.clients]
+    assert len(per_shard) == 1 or max(per_shard) < args.members, "members were not spread"
+
+    checks = 0
+    for key in keys:
+        for offset in (0, 1, 37, args.members // 2, args.members - 5):
+            expected = await reference.zrevrange(key, offset, offset + 19, withscores=True)
+            assert await leaderboard_shards.top(key, offset, 20) == expected, f"page {key}@{offset}"
+            checks += 1
+
+        for member in random.sample(members, args.samples):
+            (position,) = await leaderboard_shards.ranks([key], member)
+            assert position == await reference.zrevrank(key, member), f"rank {key} {member}"
+
+            radius = random.randint(1, 6)
+            rank, first, flat = await around(keys=[key], args=[member, radius])
+            expected = [(flat[i], float(flat[i + 1])) for i in range(0, len(flat), 2)]
+            (result,) = await leaderboard_shards.positions([key], member, radius)
+            got = [*result.ahead, (member, result.score), *result.behind]
+            assert (result.position, result.position - len(result.ahead), got) == (rank, first, expected), f"around {key} {member}"
+            checks += 2
+
+    (missing,) = await leaderboard_shards.ranks([keys[0]], "not-a-member")
+    assert missing is None
+    print(f"OK: {checks} checks over {len(keys)} boards, {args.members} members, {len(leaderboard_shards.clients)} shards")
+
+if __name__ == "__main__":
+    run()